@@ -14,6 +14,39 @@ import uuid
 from concurrent.futures import ThreadPoolExecutor
 from typing import BinaryIO, Dict, Optional, Sequence, Union
 
+try:
+    # orjson serializes directly to UTF-8 bytes and is much faster for large
+    # payloads such as document sources. It is optional, since the runner may
+    # be launched with an interpreter that does not have it.
+    from orjson import JSONDecodeError, JSONEncodeError
+    from orjson import dumps as _orjson_dumps
+    from orjson import loads as _orjson_loads
+
+    # Strings with lone surrogates are rejected by orjson, both as text and as
+    # escapes. json escapes them instead, so such messages fall back to json.
+
+    def json_dumps_bytes(data) -> bytes:
+        """Serializes data to UTF-8 encoded JSON."""
+        try:
+            return _orjson_dumps(data)
+        except JSONEncodeError:
+            return json.dumps(data).encode("utf-8")
+
+    def json_loads(content: bytes):
+        """Deserializes UTF-8 encoded JSON."""
+        try:
+            return _orjson_loads(content)
+        except JSONDecodeError:
+            return json.loads(content)
+
+except ImportError:
+    from json import loads as json_loads
+
+    def json_dumps_bytes(data) -> bytes:
+        """Serializes data to UTF-8 encoded JSON."""
+        return json.dumps(data).encode("utf-8")
+
+
 CONTENT_LENGTH = "Content-Length: "
 RUNNER_SCRIPT = str(pathlib.Path(__file__).parent / "lsp_runner.py")
 
@@ -47,12 +80,12 @@ class JsonWriter:
         if self._writer.closed:
             raise StreamClosedException()
 
+        content = json_dumps_bytes(data)
         with self._lock:
-            content = json.dumps(data)
-            length = len(content.encode("utf-8"))
             self._writer.write(
-                f"{CONTENT_LENGTH}{length}\r\n\r\n{content}".encode("utf-8")
+                f"{CONTENT_LENGTH}{len(content)}\r\n\r\n".encode("utf-8")
             )
+            self._writer.write(content)
             self._writer.flush()
 
 
@@ -81,8 +114,7 @@ class JsonReader:
         while line:
             line = to_str(self._readline()).strip()
 
-        content = to_str(self._reader.read(length))
-        return json.loads(content)
+        return json_loads(self._reader.read(length))
 
     def _readline(self):
         line = self._reader.readline()
@@ -97,6 +129,7 @@ class JsonRpc:
     def __init__(self, reader: io.TextIOWrapper, writer: io.TextIOWrapper):
         self._reader = JsonReader(reader)
         self._writer = JsonWriter(writer)
+        self._request_lock = threading.Lock()
 
     def close(self):
         """Closes the underlying streams."""
@@ -117,6 +150,12 @@ class JsonRpc:
         """Receive data in JSON-RPC format."""
         return self._reader.read()
 
+    def request(self, data):
+        """Send given data and wait for the response, one request at a time."""
+        with self._request_lock:
+            self.send_data(data)
+            return self.receive_data()
+
 
 def create_json_rpc(readable: BinaryIO, writable: BinaryIO) -> JsonRpc:
     """Creates JSON-RPC wrapper for the readable and writable streams."""
@@ -186,6 +225,7 @@ class ProcessManager:
 
 
 _process_manager = ProcessManager()
+_start_lock = threading.Lock()
 atexit.register(_process_manager.stop_all_processes)
 
 
@@ -205,11 +245,12 @@ def get_or_start_json_rpc(
     env: Optional[Dict[str, str]] = None,
 ) -> Union[JsonRpc, None]:
     """Gets an existing JSON-RPC connection or starts one and return it."""
-    res = _get_json_rpc(workspace)
-    if not res:
-        args = [*interpreter, RUNNER_SCRIPT]
-        _process_manager.start_process(workspace, args, cwd, env)
+    with _start_lock:
         res = _get_json_rpc(workspace)
+        if not res:
+            args = [*interpreter, RUNNER_SCRIPT]
+            _process_manager.start_process(workspace, args, cwd, env)
+            res = _get_json_rpc(workspace)
     return res
 
 
@@ -251,9 +292,7 @@ def run_over_json_rpc(
     if source:
         msg["source"] = source
 
-    rpc.send_data(msg)
-
-    data = rpc.receive_data()
+    data = rpc.request(msg)
 
     if data["id"] != msg_id:
         return RpcRunResult(
@@ -1,17 +1,23 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT License.
 """Implementation of tool support over LSP."""
+# pylint: disable=too-many-lines
 from __future__ import annotations
 
-import copy
+import asyncio
+import concurrent.futures
+import functools
+import importlib.util
 import json
 import os
 import pathlib
 import re
+import shutil
 import sys
 import sysconfig
+import threading
 import traceback
-from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 
 # **********************************************************
@@ -66,10 +72,17 @@ from lsprotocol import types as lsp
 from pygls import server, uris, workspace
 
 WORKSPACE_SETTINGS = {}
+# Digest of the settings for each workspace, used in lint cache keys.
+WORKSPACE_FINGERPRINTS: Dict[str, bytes] = {}
+# (workspace key, workspace key with trailing separator) pairs, longest first.
+WORKSPACE_PREFIXES: List[Tuple[str, str]] = []
 GLOBAL_SETTINGS = {}
 RUNNER = pathlib.Path(__file__).parent / "runner.py"
 
-MAX_WORKERS = 5
+# Size the worker pools to the host unless overridden by the environment.
+MAX_WORKERS = max(
+    1, int(os.getenv("VSCODE_PYLINT_MAX_WORKERS", "0")) or min(os.cpu_count() or 4, 8)
+)
 LSP_SERVER = server.LanguageServer(
     name="pylint-server", version="v0.1.0", max_workers=MAX_WORKERS
 )
@@ -96,58 +109,298 @@ MIN_VERSION = "2.12.2"
 # Captures version of `pylint` in various workspaces.
 VERSION_TABLE: Dict[str, (int, int, int)] = {}
 
+# Output of `pylint --version` keyed by how the linter is run.
+VERSION_RESULT_CACHE: Dict[tuple, utils.RunResult] = {}
+
+# Output of `pylint --version` from previous sessions, keyed the same way and
+# stamped with the file that pylint was found at.
+VERSION_CACHE_FILE = (
+    pathlib.Path(os.getenv("XDG_CACHE_HOME") or pathlib.Path.home() / ".cache")
+    / "vscode-pylint"
+    / "versions.json"
+)
+
+# Prints the location of `__pkginfo__.py` of the pylint that `lsp_runner.py`
+# imports, with `sys.path` set up the same way. Much cheaper than running
+# `pylint --version`, editable, user site and `PYTHONPATH` installs included.
+TOOL_LOCATION_PROBE = f"""
+import importlib.util, os, sys
+strategy = os.getenv("LS_IMPORT_STRATEGY", "useBundled")
+for path in (sys.argv[1], os.getcwd()):
+    if path not in sys.path and os.path.isdir(path):
+        if strategy == "useBundled":
+            sys.path.insert(0, path)
+        else:
+            sys.path.append(path)
+spec = importlib.util.find_spec("{TOOL_MODULE}")
+if spec and spec.origin:
+    print(os.path.join(os.path.dirname(spec.origin), "__pkginfo__.py"))
+"""
+
+# Parsed diagnostics of recent lint runs keyed by
+# (path, source hash, settings, extra args). Results also depend on imported
+# modules and on pylint configuration files, so the cache is cleared whenever
+# a document is saved.
+LINT_RESULT_CACHE = utils.LRUCache(maxsize=64)
+
+# Raw linter output larger than this (in characters) is not logged.
+MAX_LOGGED_OUTPUT = 8192
+
+# Fingerprint of the diagnostics, and of the document version when the client
+# supports it, last published for each open document.
+LAST_PUBLISHED: Dict[str, int] = {}
+
+# Number of times each document was closed. Lints started before a close do
+# not publish, checked under PUBLISH_LOCK which the close handler also holds.
+CLOSE_GENERATIONS: Dict[str, int] = {}
+PUBLISH_LOCK = threading.Lock()
+
+
+# Delay (in seconds) used to coalesce bursts of lint requests for a document.
+LINT_DEBOUNCE_DELAY = 0.2
+
+# Pending lint timers per document uri.
+LINT_TIMERS: Dict[str, threading.Timer] = {}
+LINT_TIMERS_LOCK = threading.Lock()
+
+# Lints run on their own pool so that long pylint runs never hold up the
+# threads pygls uses to serve other requests.
+LINT_POOL = concurrent.futures.ThreadPoolExecutor(
+    max_workers=MAX_WORKERS, thread_name_prefix="pylint"
+)
+
+
+# When set, diagnostics are only computed when the client pulls them.
+PULL_DIAGNOSTICS = bool(os.getenv("VSCODE_PYLINT_PULL_DIAGNOSTICS"))
+
 
 @LSP_SERVER.feature(lsp.TEXT_DOCUMENT_DID_OPEN)
 def did_open(params: lsp.DidOpenTextDocumentParams) -> None:
     """LSP handler for textDocument/didOpen request."""
-    document = LSP_SERVER.workspace.get_document(params.text_document.uri)
-    diagnostics: list[lsp.Diagnostic] = _linting_helper(document)
-    LSP_SERVER.publish_diagnostics(document.uri, diagnostics)
+    if not PULL_DIAGNOSTICS:
+        _schedule_lint(params.text_document.uri)
 
 
 @LSP_SERVER.feature(lsp.TEXT_DOCUMENT_DID_SAVE)
 def did_save(params: lsp.DidSaveTextDocumentParams) -> None:
     """LSP handler for textDocument/didSave request."""
-    document = LSP_SERVER.workspace.get_document(params.text_document.uri)
-    diagnostics: list[lsp.Diagnostic] = _linting_helper(document)
-    LSP_SERVER.publish_diagnostics(document.uri, diagnostics)
+    # The saved file can be imported by, or configure, any other document.
+    LINT_RESULT_CACHE.clear()
+    if not PULL_DIAGNOSTICS:
+        # Saving is how users ask for a fresh lint, pylint always runs for it.
+        _schedule_lint(params.text_document.uri, use_cache=False)
 
 
 @LSP_SERVER.feature(lsp.TEXT_DOCUMENT_DID_CLOSE)
 def did_close(params: lsp.DidCloseTextDocumentParams) -> None:
     """LSP handler for textDocument/didClose request."""
-    document = LSP_SERVER.workspace.get_document(params.text_document.uri)
-    # Publishing empty diagnostics to clear the entries for this file.
-    LSP_SERVER.publish_diagnostics(document.uri, [])
+    uri = params.text_document.uri
+    _cancel_scheduled_lint(uri)
+    utils.cancel_run(uri)
+    document = LSP_SERVER.workspace.get_document(uri)
+    with PUBLISH_LOCK:
+        CLOSE_GENERATIONS[uri] = CLOSE_GENERATIONS.get(uri, 0) + 1
+        LAST_PUBLISHED.pop(uri, None)
+        # Publishing empty diagnostics to clear the entries for this file.
+        LSP_SERVER.publish_diagnostics(document.uri, [])
 
 
-if os.getenv("VSCODE_PYLINT_LINT_ON_CHANGE"):
+if os.getenv("VSCODE_PYLINT_LINT_ON_CHANGE") and not PULL_DIAGNOSTICS:
 
     @LSP_SERVER.feature(lsp.TEXT_DOCUMENT_DID_CHANGE)
     def did_change(params: lsp.DidChangeTextDocumentParams) -> None:
         """LSP handler for textDocument/didChange request."""
-        document = LSP_SERVER.workspace.get_document(params.text_document.uri)
-        diagnostics: list[lsp.Diagnostic] = _linting_helper(document)
-        LSP_SERVER.publish_diagnostics(document.uri, diagnostics)
+        _schedule_lint(params.text_document.uri)
+
+
+if PULL_DIAGNOSTICS:
+
+    @LSP_SERVER.feature(
+        lsp.TEXT_DOCUMENT_DIAGNOSTIC,
+        lsp.DiagnosticOptions(
+            inter_file_dependencies=False, workspace_diagnostics=False
+        ),
+    )
+    async def document_diagnostic(
+        params: lsp.DocumentDiagnosticParams,
+    ) -> lsp.DocumentDiagnosticReport:
+        """LSP handler for textDocument/diagnostic request."""
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                LINT_POOL, _get_document_diagnostic_report, params
+            )
+        except utils.RunCancelledError as error:
+            # Superseded by a newer request, or the document was closed. pygls
+            # answers a cancelled request with RequestCancelled, on which the
+            # client keeps its diagnostics and pulls again. An empty report
+            # would clear them instead.
+            raise asyncio.CancelledError() from error
+
 
+def _get_document_diagnostic_report(
+    params: lsp.DocumentDiagnosticParams,
+) -> lsp.DocumentDiagnosticReport:
+    """Lints the document and reports diagnostics, or that they are unchanged
+    since the result the client already has.
 
-def _linting_helper(document: workspace.Document) -> list[lsp.Diagnostic]:
+    Raises `RunCancelledError` if the lint is superseded before it completes.
+    """
+    uri = params.text_document.uri
+    # Results of any lint still running for this document would be stale.
+    utils.cancel_run(uri)
+    document = LSP_SERVER.workspace.get_document(uri)
+    diagnostics: list[lsp.Diagnostic] = _linting_helper(document)
+    result_id = str(_get_diagnostics_fingerprint(diagnostics))
+    if params.previous_result_id == result_id:
+        return lsp.RelatedUnchangedDocumentDiagnosticReport(result_id=result_id)
+    return lsp.RelatedFullDocumentDiagnosticReport(
+        items=diagnostics, result_id=result_id
+    )
+
+
+def _schedule_lint(uri: str, use_cache: bool = True) -> None:
+    """Schedules linting of the document, coalescing requests that arrive within
+    `LINT_DEBOUNCE_DELAY` of each other into a single run.
+
+    If `use_cache` is False, pylint runs even if the result of an earlier run
+    for the same source is cached.
+    """
+    if uri.startswith("vscode-notebook-cell"):
+        # Not supported, skip before creating a timer and looking up the document.
+        return
+    with LINT_TIMERS_LOCK:
+        pending = LINT_TIMERS.get(uri, None)
+        if pending:
+            pending.cancel()
+            # The coalesced run must still bypass the cache if either did.
+            use_cache = use_cache and pending.args[1]
+        timer = threading.Timer(
+            LINT_DEBOUNCE_DELAY, _on_lint_timer, args=(uri, use_cache)
+        )
+        timer.daemon = True
+        LINT_TIMERS[uri] = timer
+    timer.start()
+
+
+def _cancel_scheduled_lint(uri: str) -> None:
+    """Cancels pending lint for the document, if any."""
+    with LINT_TIMERS_LOCK:
+        pending = LINT_TIMERS.pop(uri, None)
+    if pending:
+        pending.cancel()
+
+
+def _on_lint_timer(uri: str, use_cache: bool) -> None:
+    with LINT_TIMERS_LOCK:
+        if LINT_TIMERS.get(uri, None) is not threading.current_thread():
+            # Superseded or cancelled after this timer fired.
+            return
+        del LINT_TIMERS[uri]
+        # Read while the timer is still current, a close after this point bumps
+        # the generation and the result is dropped.
+        generation = CLOSE_GENERATIONS.get(uri, 0)
+    # Run on the lint pool rather than on the timer thread.
+    LINT_POOL.submit(_lint_and_publish_diagnostics, uri, use_cache, generation)
+
+
+def _lint_and_publish_diagnostics(uri: str, use_cache: bool, generation: int) -> None:
+    """Lints the document and publishes the diagnostics, unless it was closed
+    since `generation` was read from `CLOSE_GENERATIONS`."""
+    # Results of any lint still running for this document would be stale.
+    utils.cancel_run(uri)
+    document = LSP_SERVER.workspace.get_document(uri)
+    # Read before linting, the document can change while pylint runs.
+    version = document.version if _supports_diagnostics_version() else None
+    try:
+        diagnostics: list[lsp.Diagnostic] = _linting_helper(document, use_cache)
+    except utils.RunCancelledError:
+        # Superseded by a newer lint of this document.
+        return
+    fingerprint = hash((_get_diagnostics_fingerprint(diagnostics), version))
+    with PUBLISH_LOCK:
+        if CLOSE_GENERATIONS.get(uri, 0) != generation:
+            # Closed while linting, its diagnostics have been cleared.
+            return
+        if LAST_PUBLISHED.get(document.uri, None) == fingerprint:
+            # The client already has exactly these diagnostics.
+            return
+        LAST_PUBLISHED[document.uri] = fingerprint
+        LSP_SERVER.publish_diagnostics(document.uri, diagnostics, version)
+
+
+def _supports_diagnostics_version() -> bool:
+    """Returns True if the client accepts the document version with published
+    diagnostics."""
+    text_document = LSP_SERVER.client_capabilities.text_document
+    publish = text_document.publish_diagnostics if text_document else None
+    return bool(publish and publish.version_support)
+
+
+def _get_diagnostics_fingerprint(diagnostics: List[lsp.Diagnostic]) -> int:
+    return hash(
+        tuple(
+            (
+                d.range.start.line,
+                d.range.start.character,
+                d.range.end.line,
+                d.range.end.character,
+                d.severity,
+                d.code,
+                d.message,
+            )
+            for d in diagnostics
+        )
+    )
+
+
+def _linting_helper(
+    document: workspace.Document, use_cache: bool = True
+) -> list[lsp.Diagnostic]:
     try:
         extra_args = []
 
-        code_workspace = _get_settings_by_document(document)["workspaceFS"]
+        settings = _get_settings_by_document(document)
+        # Checked before hashing the source, ignored files are the common case
+        # in large workspaces.
+        if _should_skip_document(document, settings):
+            return []
+
+        code_workspace = settings["workspaceFS"]
         if VERSION_TABLE.get(code_workspace, None):
             major, minor, _ = VERSION_TABLE[code_workspace]
             if (major, minor) >= (2, 16):
                 extra_args += ["--clear-cache-post-run=y"]
 
-        result = _run_tool_on_document(document, use_stdin=True, extra_args=extra_args)
-        if result and result.stdout:
-            log_to_output(f"{document.uri} :\r\n{result.stdout}")
+        # Re-use the result of a previous run if the document source and the
+        # settings used to lint it have not changed since.
+        cache_key = (
+            document.path,
+            utils.get_content_hash(document.source),
+            _get_settings_fingerprint(settings),
+            tuple(extra_args),
+        )
+        diagnostics = LINT_RESULT_CACHE.get(cache_key) if use_cache else None
+        if diagnostics is None:
+            diagnostics = []
+            result = _run_tool_on_document(
+                document, use_stdin=True, extra_args=extra_args
+            )
+            if result and result.stdout:
+                # The raw linter output can be large, only send it when the client
+                # has tracing enabled.
+                if _is_tracing():
+                    _log_lint_output(document.uri, result.stdout)
+
+                diagnostics = _parse_output(
+                    result.stdout, severity=settings["severity"]
+                )
+            if result is not None:
+                LINT_RESULT_CACHE.put(cache_key, diagnostics)
 
-            # deep copy here to prevent accidentally updating global settings.
-            settings = copy.deepcopy(_get_settings_by_document(document))
-            return _parse_output(result.stdout, severity=settings["severity"])
+        return diagnostics
+    except utils.RunCancelledError:
+        raise
     except Exception:  # pylint: disable=broad-except
         LSP_SERVER.show_message_log(
             f"Linting failed with error:\r\n{traceback.format_exc()}",
@@ -156,29 +409,77 @@ def _linting_helper(document: workspace.Document) -> list[lsp.Diagnostic]:
     return []
 
 
+def _log_lint_output(uri: str, output: str) -> None:
+    """Logs the raw linter output, or only its size when it is too large to be
+    useful in the output channel."""
+    if len(output) <= MAX_LOGGED_OUTPUT:
+        log_to_output(f"{uri} :\r\n{output}")
+    else:
+        log_to_output(f"{uri} : {len(output)} characters of output (not shown)")
+
+
+def _get_settings_fingerprint(settings: Dict[str, Any]) -> bytes:
+    """Returns a digest identifying the given settings."""
+    key = settings["workspaceFS"]
+    if WORKSPACE_SETTINGS.get(key, None) is settings:
+        # Workspace settings only change on initialize, where this is computed.
+        return WORKSPACE_FINGERPRINTS[key]
+    return _compute_settings_fingerprint(settings)
+
+
+def _compute_settings_fingerprint(settings: Dict[str, Any]) -> bytes:
+    return utils.get_content_hash(json.dumps(settings, sort_keys=True))
+
+
+def _get_severity_map(severity: Dict[str, str]) -> Dict[str, lsp.DiagnosticSeverity]:
+    """Converts the severity setting to LSP specific values, so that it is done
+    once per lint rather than once per message."""
+    return {
+        key: lsp.DiagnosticSeverity.__members__.get(value, lsp.DiagnosticSeverity.Error)
+        for key, value in severity.items()
+        if value
+    }
+
+
 def _get_severity(
-    symbol: str, code: str, code_type: str, severity: Dict[str, str]
+    symbol: str,
+    code: str,
+    code_type: str,
+    severity_map: Dict[str, lsp.DiagnosticSeverity],
 ) -> lsp.DiagnosticSeverity:
     """Converts severity provided by linter to LSP specific value."""
-    value = (
-        severity.get(symbol, None)
-        or severity.get(code, None)
-        or severity.get(code_type, "Error")
+    return (
+        severity_map.get(symbol, None)
+        or severity_map.get(code, None)
+        or severity_map.get(code_type, lsp.DiagnosticSeverity.Error)
     )
-    try:
-        return lsp.DiagnosticSeverity[value]
-    except KeyError:
-        pass
-
-    return lsp.DiagnosticSeverity.Error
 
 
-def _build_message_doc_url(code: str) -> str:
+@functools.lru_cache(maxsize=2048)
+def _build_message_doc_url(msg_id: str, symbol: str) -> str:
     """Build the URL to the documentation for this diagnostic message."""
-    msg_id, message = code.split(":")
     category = utils.get_message_category(msg_id)
-    uri = f"{category}/{message}.html" if category else DOCUMENTATION_HOME
-    return f"{DOCUMENTATION_HOME}/{uri}"
+    if not category:
+        return DOCUMENTATION_HOME
+    return f"{DOCUMENTATION_HOME}/{category}/{symbol}.html"
+
+
+# Start of pylint's JSON report, an array of message objects at a line start.
+REPORT_START_PATTERN = re.compile(r"^\[\s*[{\]]", re.MULTILINE)
+
+
+def _get_report(content: str) -> Optional[str]:
+    """Returns the JSON report in the linter output, or `None` if there is none.
+
+    Crashing plugins or pylint itself can print before the report, or produce
+    no report at all. The report starts on a line of its own, lines printed
+    before it can start with brackets too, i.e. "[WARNING] ...".
+    """
+    match = REPORT_START_PATTERN.search(content)
+    if match is None:
+        return None
+    report_start = match.start()
+    return content[report_start:] if report_start > 0 else content
 
 
 def _parse_output(
@@ -188,18 +489,31 @@ def _parse_output(
     """Parses linter messages and return LSP diagnostic object for each message."""
     diagnostics = []
     line_offset = 1
+    severity_map = _get_severity_map(severity)
+
+    report = _get_report(content)
+    if report is None:
+        return diagnostics
 
-    messages: List[Dict[str, Any]] = json.loads(content)
+    # Uses orjson when available, it is significantly faster at parsing large
+    # linter reports.
+    messages: List[Dict[str, Any]] = jsonrpc.json_loads(report)
     for data in messages:
+        # These fields are always present in pylint's JSON output.
+        message_id = data["message-id"]
+        symbol = data["symbol"]
+
+        # Both parsers return JSON numbers as ints, so no conversion is needed.
         start = lsp.Position(
-            line=int(data.get("line")) - line_offset,
-            character=int(data.get("column")),
+            line=data["line"] - line_offset,
+            character=data["column"],
         )
 
-        if data.get("endLine") is not None:
+        end_line = data.get("endLine")
+        if end_line is not None:
             end = lsp.Position(
-                line=int(data.get("endLine")) - line_offset,
-                character=int(data.get("endColumn", 0)),
+                line=end_line - line_offset,
+                character=data.get("endColumn", 0),
             )
         else:
             # If there is no endLine we can use `start` for end position.
@@ -209,17 +523,17 @@ def _parse_output(
             # points to.
             end = start
 
-        code = f"{data.get('message-id')}:{data.get('symbol')}"
-        documentation_url = _build_message_doc_url(code)
+        # The same few codes repeat across diagnostics, share a single string.
+        code = sys.intern(f"{message_id}:{symbol}")
 
         diagnostic = lsp.Diagnostic(
             range=lsp.Range(start=start, end=end),
-            message=data.get("message"),
-            severity=_get_severity(
-                data.get("symbol"), data.get("message-id"), data.get("type"), severity
+            message=data["message"],
+            severity=_get_severity(symbol, message_id, data["type"], severity_map),
+            code=code,
+            code_description=lsp.CodeDescription(
+                href=_build_message_doc_url(message_id, symbol)
             ),
-            code=f"{data.get('message-id')}:{data.get('symbol')}",
-            code_description=lsp.CodeDescription(href=documentation_url),
             source=TOOL_DISPLAY,
         )
 
@@ -286,10 +600,13 @@ QUICK_FIXES = QuickFixSolutions()
 )
 def code_action(params: lsp.CodeActionParams) -> List[lsp.CodeAction]:
     """LSP handler for textDocument/codeAction request."""
+    code_actions = []
+    # Requested on most cursor moves, usually without any of our diagnostics.
+    if not any(d.source == TOOL_DISPLAY for d in params.context.diagnostics):
+        return code_actions
 
     document = LSP_SERVER.workspace.get_document(params.text_document.uri)
-    settings = copy.deepcopy(_get_settings_by_document(document))
-    code_actions = []
+    settings = _get_settings_by_document(document)
     if not settings["enabled"]:
         return code_actions
 
@@ -395,11 +712,7 @@ REPLACEMENTS: Dict[str, re.Pattern] = {
 def _get_replacement_edit(diagnostic: lsp.Diagnostic, lines: List[str]) -> lsp.TextEdit:
     new_line = lines[diagnostic.range.start.line]
     for replacement in REPLACEMENTS[diagnostic.code]:
-        new_line = re.sub(
-            replacement["pattern"],
-            replacement["repl"],
-            new_line,
-        )
+        new_line = replacement["pattern"].sub(replacement["repl"], new_line)
     return lsp.TextEdit(
         lsp.Range(
             start=lsp.Position(line=diagnostic.range.start.line, character=0),
@@ -432,10 +745,12 @@ def code_action_resolve(params: lsp.CodeAction) -> lsp.CodeAction:
     """LSP handler for codeAction/resolve request."""
     if params.data:
         document = LSP_SERVER.workspace.get_document(params.data)
+        # `document.lines` splits the whole source on each access.
+        lines = document.lines
         params.edit = _create_workspace_edits(
             document,
             [
-                _get_replacement_edit(diagnostic, document.lines)
+                _get_replacement_edit(diagnostic, lines)
                 for diagnostic in params.diagnostics
                 if diagnostic.source == TOOL_DISPLAY and diagnostic.code in REPLACEMENTS
             ],
@@ -484,7 +799,7 @@ def _create_workspace_edits(
 @LSP_SERVER.feature(lsp.INITIALIZE)
 def initialize(params: lsp.InitializeParams) -> None:
     """LSP handler for initialize request."""
-    log_to_output(f"CWD Server: {os.getcwd()}")
+    log_to_output(f"CWD Server: {os.getcwd()}\r\nMax workers: {MAX_WORKERS}")
     import_strategy = os.getenv("LS_IMPORT_STRATEGY", "useBundled")
     update_sys_path(os.getcwd(), import_strategy)
 
@@ -492,43 +807,176 @@ def initialize(params: lsp.InitializeParams) -> None:
 
     settings = params.initialization_options["settings"]
     _update_workspace_settings(settings)
-    log_to_output(
-        f"Settings used to run Server:\r\n{json.dumps(settings, indent=4, ensure_ascii=False)}\r\n"
-    )
-    log_to_output(
-        f"Global settings:\r\n{json.dumps(GLOBAL_SETTINGS, indent=4, ensure_ascii=False)}\r\n"
+    # Settings are pretty printed only when the client is tracing, otherwise
+    # they are logged on a single line.
+    tracing = _is_tracing(params.trace)
+    indent = 4 if tracing else None
+    settings_json = json.dumps(settings, indent=indent, ensure_ascii=False)
+    log_to_output(f"Settings used to run Server:\r\n{settings_json}\r\n")
+    global_settings_json = json.dumps(
+        GLOBAL_SETTINGS, indent=indent, ensure_ascii=False
     )
+    log_to_output(f"Global settings:\r\n{global_settings_json}\r\n")
 
     # Add extra paths to sys.path
-    setting = _get_settings_by_path(pathlib.Path(os.getcwd()))
+    setting = _get_settings_by_path(os.getcwd())
     for extra in setting.get("extraPaths", []):
         update_sys_path(extra, import_strategy)
 
-    paths = "\r\n   ".join(sys.path)
-    log_to_output(f"sys.path used to run Server:\r\n   {paths}")
+    if tracing:
+        paths = "\r\n   ".join(sys.path)
+        log_to_output(f"sys.path used to run Server:\r\n   {paths}")
 
     _log_version_info()
+    LINT_POOL.submit(_warm_up_linters)
+
+
+@LSP_SERVER.feature(lsp.WORKSPACE_DID_CHANGE_WORKSPACE_FOLDERS)
+def did_change_workspace_folders(
+    params: lsp.DidChangeWorkspaceFoldersParams,
+) -> None:
+    """LSP handler for workspace/didChangeWorkspaceFolders request."""
+    # Files in added folders are linted with the global settings, as before.
+    # Removed folders are forgotten so that their entries do not accumulate.
+    _remove_workspace_settings(
+        [
+            utils.normalize_path(uris.to_fs_path(folder.uri))
+            for folder in params.event.removed
+        ]
+    )
 
 
 @LSP_SERVER.feature(lsp.EXIT)
 def on_exit(_params: Optional[Any] = None) -> None:
     """Handle clean up on exit."""
+    LINT_POOL.shutdown(wait=False)
     jsonrpc.shutdown_json_rpc()
 
 
 @LSP_SERVER.feature(lsp.SHUTDOWN)
 def on_shutdown(_params: Optional[Any] = None) -> None:
     """Handle clean up on shutdown."""
+    LINT_POOL.shutdown(wait=False)
     jsonrpc.shutdown_json_rpc()
 
 
+def _warm_up_linters() -> None:
+    """Starts the JSON-RPC runner, or imports pylint in-process, for each
+    workspace so that the first lint does not pay for it."""
+    imported = False
+    for settings in list(WORKSPACE_SETTINGS.values()):
+        try:
+            mode, _ = _get_run_mode(settings)
+            if mode == "rpc":
+                jsonrpc.get_or_start_json_rpc(
+                    settings["workspaceFS"],
+                    settings["interpreter"],
+                    get_cwd(settings, None),
+                    _get_updated_env(settings),
+                )
+            elif mode == "module" and not imported:
+                # Same sys.path handling as `utils.run_module`.
+                with utils.CWD_LOCK, utils.substitute_attr(
+                    sys, "path", [""] + sys.path[:]
+                ):
+                    importlib.import_module(f"{TOOL_MODULE}.lint")
+                imported = True
+        except Exception:  # pylint: disable=broad-except
+            log_to_output(f"Failed to warm up linter:\r\n{traceback.format_exc()}")
+
+
+def _get_version_result(settings: Dict[str, Any]) -> utils.RunResult:
+    """Runs `pylint --version`, re-using the result for workspaces that run the
+    linter the same way."""
+    key = (
+        tuple(settings["path"]),
+        tuple(settings["interpreter"]),
+        settings["importStrategy"],
+        tuple(settings.get("extraPaths", [])),
+    )
+    if key not in VERSION_RESULT_CACHE:
+        stamp = _get_version_stamp(settings)
+        disk_cache = _read_version_cache()
+        disk_key = json.dumps(key)
+        entry = disk_cache.get(disk_key, None)
+        if stamp is not None and entry and entry["stamp"] == stamp:
+            VERSION_RESULT_CACHE[key] = utils.RunResult(entry["stdout"], "")
+        else:
+            result = _run_tool(["--version"], settings)
+            VERSION_RESULT_CACHE[key] = result
+            if stamp is not None and result.stdout:
+                disk_cache[disk_key] = {"stamp": stamp, "stdout": result.stdout}
+                _write_version_cache(disk_cache)
+    return VERSION_RESULT_CACHE[key]
+
+
+def _get_version_stamp(settings: Dict[str, Any]) -> Optional[List[Any]]:
+    """Returns the location, modification time and size of the file pylint is
+    run from, or `None` if it cannot be determined."""
+    mode, argv = _get_run_mode(settings)
+    if mode == "path":
+        if len(argv) > 1:
+            # A command such as `conda run ...`, the version can't be tracked.
+            return None
+        location = shutil.which(argv[0])
+    elif mode == "rpc":
+        location = _find_tool_pkginfo(settings)
+    else:
+        spec = importlib.util.find_spec(TOOL_MODULE)
+        location = spec.origin if spec else None
+        if location:
+            location = os.path.join(os.path.dirname(location), "__pkginfo__.py")
+
+    try:
+        stat = os.stat(location) if location else None
+    except OSError:
+        stat = None
+    if stat is None:
+        return None
+    return [os.path.normcase(location), stat.st_mtime_ns, stat.st_size]
+
+
+def _find_tool_pkginfo(settings: Dict[str, Any]) -> Optional[str]:
+    """Returns the location of `__pkginfo__.py` of the pylint that the runner
+    imports under the interpreter in the settings, or `None` if not found."""
+    try:
+        result = utils.run_path(
+            argv=settings["interpreter"]
+            + ["-c", TOOL_LOCATION_PROBE, os.fspath(BUNDLE_DIR / "libs")],
+            use_stdin=False,
+            cwd=get_cwd(settings, None),
+            env=_get_updated_env(settings),
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def _read_version_cache() -> Dict[str, Any]:
+    try:
+        return json.loads(VERSION_CACHE_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_version_cache(cache: Dict[str, Any]) -> None:
+    try:
+        VERSION_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = VERSION_CACHE_FILE.with_suffix(f".{os.getpid()}.tmp")
+        temp_file.write_text(json.dumps(cache), encoding="utf-8")
+        os.replace(temp_file, VERSION_CACHE_FILE)
+    except OSError:
+        log_to_output(
+            f"Failed to write {VERSION_CACHE_FILE}:\r\n{traceback.format_exc()}"
+        )
+
+
 def _log_version_info() -> None:
-    for value in WORKSPACE_SETTINGS.values():
+    for settings in WORKSPACE_SETTINGS.values():
         try:
             from packaging.version import parse as parse_version
 
-            settings = copy.deepcopy(value)
-            result = _run_tool(["--version"], settings)
+            result = _get_version_result(settings)
             code_workspace = settings["workspaceFS"]
             log_to_output(
                 f"Version info for linter running for {code_workspace}:\r\n{result.stdout}"
@@ -601,41 +1049,72 @@ def _update_workspace_settings(settings):
             "workspace": uris.from_fs_path(key),
             **_get_global_defaults(),
         }
-        return
+    else:
+        for setting in settings:
+            key = utils.normalize_path(uris.to_fs_path(setting["workspace"]))
+            WORKSPACE_SETTINGS[key] = {
+                **setting,
+                "workspaceFS": key,
+            }
 
-    for setting in settings:
-        key = utils.normalize_path(uris.to_fs_path(setting["workspace"]))
-        WORKSPACE_SETTINGS[key] = {
-            **setting,
-            "workspaceFS": key,
-        }
+    for key, value in WORKSPACE_SETTINGS.items():
+        WORKSPACE_FINGERPRINTS[key] = _compute_settings_fingerprint(value)
+
+    _update_workspace_prefixes()
 
 
-def _get_settings_by_path(file_path: pathlib.Path):
-    workspaces = {s["workspaceFS"] for s in WORKSPACE_SETTINGS.values()}
+def _remove_workspace_settings(keys: Sequence[str]) -> None:
+    """Forgets the settings and pylint versions of the given workspaces."""
+    for key in keys:
+        WORKSPACE_SETTINGS.pop(key, None)
+        WORKSPACE_FINGERPRINTS.pop(key, None)
+        VERSION_TABLE.pop(key, None)
 
-    while file_path != file_path.parent:
-        str_file_path = utils.normalize_path(file_path)
-        if str_file_path in workspaces:
-            return WORKSPACE_SETTINGS[str_file_path]
-        file_path = file_path.parent
+    if not WORKSPACE_SETTINGS:
+        # Fall back to settings for the current directory, as with no workspace.
+        _update_workspace_settings(None)
+    else:
+        _update_workspace_prefixes()
+
+
+def _update_workspace_prefixes() -> None:
+    # Longest first, so that the first match is the innermost workspace.
+    WORKSPACE_PREFIXES[:] = sorted(
+        ((key, key.rstrip(os.sep) + os.sep) for key in WORKSPACE_SETTINGS),
+        key=lambda item: len(item[0]),
+        reverse=True,
+    )
+    _get_directory_workspace_key.cache_clear()
+    _build_updated_env.cache_clear()
+
+
+def _get_workspace_key(file_path: str) -> str | None:
+    """Returns the key of the innermost workspace containing the given path."""
+    norm_path = utils.normalize_path(file_path)
+    for key, prefix in WORKSPACE_PREFIXES:
+        if norm_path == key or norm_path.startswith(prefix):
+            return key
+    return None
+
+
+def _get_settings_by_path(file_path: str):
+    key = _get_workspace_key(file_path)
+    if key is not None:
+        return WORKSPACE_SETTINGS[key]
 
     setting_values = list(WORKSPACE_SETTINGS.values())
     return setting_values[0]
 
 
-def _get_document_key(document: workspace.Document):
-    if WORKSPACE_SETTINGS:
-        document_workspace = pathlib.Path(document.path)
-        workspaces = {s["workspaceFS"] for s in WORKSPACE_SETTINGS.values()}
+@functools.lru_cache(maxsize=256)
+def _get_directory_workspace_key(directory: str) -> str | None:
+    """Memoized `_get_workspace_key` for the directory containing documents."""
+    return _get_workspace_key(directory)
 
-        # Find workspace settings for the given file.
-        while document_workspace != document_workspace.parent:
-            norm_path = utils.normalize_path(document_workspace)
-            if norm_path in workspaces:
-                return norm_path
-            document_workspace = document_workspace.parent
 
+def _get_document_key(document: workspace.Document):
+    if WORKSPACE_SETTINGS:
+        return _get_directory_workspace_key(os.path.dirname(document.path))
     return None
 
 
@@ -646,7 +1125,7 @@ def _get_settings_by_document(document: workspace.Document | None):
     key = _get_document_key(document)
     if key is None:
         # This is either a non-workspace file or there is no workspace.
-        key = utils.normalize_path(pathlib.Path(document.path).parent)
+        key = utils.normalize_path(os.path.dirname(document.path))
         return {
             "cwd": key,
             "workspaceFS": key,
@@ -667,71 +1146,87 @@ def get_cwd(settings: Dict[str, Any], document: Optional[workspace.Document]) ->
 
     if settings["cwd"] == "${fileDirname}":
         if document is not None:
-            return os.fspath(pathlib.Path(document.path).parent)
+            return os.path.dirname(document.path)
         return settings["workspaceFS"]
 
     return settings["cwd"]
 
 
 # pylint: disable=too-many-branches,too-many-statements
-def _run_tool_on_document(
-    document: workspace.Document,
-    use_stdin: bool = False,
-    extra_args: Optional[Sequence[str]] = None,
-) -> utils.RunResult | None:
-    """Runs tool on the given document.
-
-    if use_stdin is true then contents of the document is passed to the
-    tool via stdin.
-    """
-    if extra_args is None:
-        extra_args = []
-
-    # deep copy here to prevent accidentally updating global settings.
-    settings = copy.deepcopy(_get_settings_by_document(document))
-
+def _should_skip_document(
+    document: workspace.Document, settings: Dict[str, Any]
+) -> bool:
+    """Returns True, logging why, if the document must not be linted."""
     if not settings["enabled"]:
         log_warning(f"Skipping file [Linting Disabled]: {document.path}")
         log_warning("See `pylint.enabled` in settings.json to enabling linting.")
-        return None
+        return True
 
     if str(document.uri).startswith("vscode-notebook-cell"):
         log_warning(f"Skipping notebook cells [Not Supported]: {str(document.uri)}")
-        return None
+        return True
 
     if utils.is_stdlib_file(document.path):
         log_warning(
             f"Skipping standard library file (stdlib excluded): {document.path}"
         )
 
-        return None
+        return True
+
+    if utils.is_vendored_file(document.path):
+        log_warning(
+            f"Skipping third party or virtual environment file: {document.path}"
+        )
+        return True
 
     if utils.is_match(settings["ignorePatterns"], document.path):
         log_warning(
             f"Skipping file due to `pylint.ignorePatterns` match: {document.path}"
         )
-        return None
+        return True
 
-    code_workspace = settings["workspaceFS"]
-    cwd = get_cwd(settings, document)
+    return False
 
-    use_path = False
-    use_rpc = False
+
+def _get_run_mode(settings: Dict[str, Any]) -> Tuple[str, List[str]]:
+    """Returns how pylint is run for the given settings, one of "path", "rpc" or
+    "module", and a new argv list to run it with."""
     if settings["path"]:
         # 'path' setting takes priority over everything.
-        use_path = True
-        argv = settings["path"]
-    elif settings["interpreter"] and not utils.is_current_interpreter(
+        return "path", list(settings["path"])
+    if settings["interpreter"] and not utils.is_current_interpreter(
         settings["interpreter"][0]
     ):
         # If there is a different interpreter set use JSON-RPC to the subprocess
         # running under that interpreter.
-        argv = [TOOL_MODULE]
-        use_rpc = True
-    else:
-        # if the interpreter is same as the interpreter running this
-        # process then run as module.
-        argv = [TOOL_MODULE]
+        return "rpc", [TOOL_MODULE]
+    # if the interpreter is same as the interpreter running this
+    # process then run as module.
+    return "module", [TOOL_MODULE]
+
+
+def _run_tool_on_document(
+    document: workspace.Document,
+    use_stdin: bool = False,
+    extra_args: Optional[Sequence[str]] = None,
+) -> utils.RunResult | None:
+    """Runs tool on the given document.
+
+    if use_stdin is true then contents of the document is passed to the
+    tool via stdin. Callers check `_should_skip_document` first.
+    """
+    if extra_args is None:
+        extra_args = []
+
+    # Settings are shared, they must only be read here.
+    settings = _get_settings_by_document(document)
+
+    code_workspace = settings["workspaceFS"]
+    cwd = get_cwd(settings, document)
+
+    mode, argv = _get_run_mode(settings)
+    use_path = mode == "path"
+    use_rpc = mode == "rpc"
 
     argv += TOOL_ARGS + settings["args"] + extra_args
 
@@ -752,22 +1247,23 @@ def _run_tool_on_document(
 
     if use_path:
         # This mode is used when running executables.
-        log_to_output(" ".join(argv))
-        log_to_output(f"CWD Server: {cwd}")
+        log_to_output(f"{' '.join(argv)}\r\nCWD Server: {cwd}")
         result = utils.run_path(
             argv=argv,
             use_stdin=use_stdin,
             cwd=cwd,
             source=document.source.replace("\r\n", "\n"),
             env=env,
+            key=document.uri if use_stdin else None,
         )
         if result.stderr:
             log_to_output(result.stderr)
     elif use_rpc:
         # This mode is used if the interpreter running this server is different from
         # the interpreter used for running this server.
-        log_to_output(" ".join(settings["interpreter"] + ["-m"] + argv))
-        log_to_output(f"CWD Linter: {cwd}")
+        log_to_output(
+            " ".join(settings["interpreter"] + ["-m"] + argv) + f"\r\nCWD Linter: {cwd}"
+        )
 
         result = jsonrpc.run_over_json_rpc(
             workspace=code_workspace,
@@ -782,22 +1278,19 @@ def _run_tool_on_document(
         result = _to_run_result_with_logging(result)
     else:
         # In this mode the tool is run as a module in the same process as the language server.
-        log_to_output(" ".join([sys.executable, "-m"] + argv))
-        log_to_output(f"CWD Linter: {cwd}")
-        # This is needed to preserve sys.path, in cases where the tool modifies
-        # sys.path and that might not work for this scenario next time around.
-        with utils.substitute_attr(sys, "path", [""] + sys.path[:]):
-            try:
-                result = utils.run_module(
-                    module=TOOL_MODULE,
-                    argv=argv,
-                    use_stdin=use_stdin,
-                    cwd=cwd,
-                    source=document.source,
-                )
-            except Exception:
-                log_error(traceback.format_exc(chain=True))
-                raise
+        log_to_output(
+            " ".join([sys.executable, "-m"] + argv) + f"\r\nCWD Linter: {cwd}"
+        )
+        try:
+            result = _run_in_process(
+                argv=argv,
+                use_stdin=use_stdin,
+                cwd=cwd,
+                source=document.source,
+            )
+        except Exception:
+            log_error(traceback.format_exc(chain=True))
+            raise
         if result.stderr:
             log_to_output(result.stderr)
 
@@ -809,23 +1302,9 @@ def _run_tool(extra_args: Sequence[str], settings: Dict[str, Any]) -> utils.RunR
     code_workspace = settings["workspaceFS"]
     cwd = get_cwd(settings, None)
 
-    use_path = False
-    use_rpc = False
-    if len(settings["path"]) > 0:
-        # 'path' setting takes priority over everything.
-        use_path = True
-        argv = settings["path"]
-    elif len(settings["interpreter"]) > 0 and not utils.is_current_interpreter(
-        settings["interpreter"][0]
-    ):
-        # If there is a different interpreter set use JSON-RPC to the subprocess
-        # running under that interpreter.
-        argv = [TOOL_MODULE]
-        use_rpc = True
-    else:
-        # if the interpreter is same as the interpreter running this
-        # process then run as module.
-        argv = [TOOL_MODULE]
+    mode, argv = _get_run_mode(settings)
+    use_path = mode == "path"
+    use_rpc = mode == "rpc"
 
     argv += extra_args
 
@@ -837,16 +1316,16 @@ def _run_tool(extra_args: Sequence[str], settings: Dict[str, Any]) -> utils.RunR
 
     if use_path:
         # This mode is used when running executables.
-        log_to_output(" ".join(argv))
-        log_to_output(f"CWD Server: {cwd}")
+        log_to_output(f"{' '.join(argv)}\r\nCWD Server: {cwd}")
         result = utils.run_path(argv=argv, use_stdin=True, cwd=cwd, env=env)
         if result.stderr:
             log_to_output(result.stderr)
     elif use_rpc:
         # This mode is used if the interpreter running this server is different from
         # the interpreter used for running this server.
-        log_to_output(" ".join(settings["interpreter"] + ["-m"] + argv))
-        log_to_output(f"CWD Linter: {cwd}")
+        log_to_output(
+            " ".join(settings["interpreter"] + ["-m"] + argv) + f"\r\nCWD Linter: {cwd}"
+        )
         result = jsonrpc.run_over_json_rpc(
             workspace=code_workspace,
             interpreter=settings["interpreter"],
@@ -859,18 +1338,14 @@ def _run_tool(extra_args: Sequence[str], settings: Dict[str, Any]) -> utils.RunR
         result = _to_run_result_with_logging(result)
     else:
         # In this mode the tool is run as a module in the same process as the language server.
-        log_to_output(" ".join([sys.executable, "-m"] + argv))
-        log_to_output(f"CWD Linter: {cwd}")
-        # This is needed to preserve sys.path, in cases where the tool modifies
-        # sys.path and that might not work for this scenario next time around.
-        with utils.substitute_attr(sys, "path", [""] + sys.path[:]):
-            try:
-                result = utils.run_module(
-                    module=TOOL_MODULE, argv=argv, use_stdin=True, cwd=cwd
-                )
-            except Exception:
-                log_error(traceback.format_exc(chain=True))
-                raise
+        log_to_output(
+            " ".join([sys.executable, "-m"] + argv) + f"\r\nCWD Linter: {cwd}"
+        )
+        try:
+            result = _run_in_process(argv=argv, use_stdin=True, cwd=cwd)
+        except Exception:
+            log_error(traceback.format_exc(chain=True))
+            raise
         if result.stderr:
             log_to_output(result.stderr)
 
@@ -878,14 +1353,53 @@ def _run_tool(extra_args: Sequence[str], settings: Dict[str, Any]) -> utils.RunR
     return result
 
 
-def _get_updated_env(settings: Dict[str, Any]) -> str:
-    """Returns the updated environment variables."""
-    extra_paths = settings.get("extraPaths", [])
-    paths = os.environ.get("PYTHONPATH", "").split(os.pathsep) + extra_paths
+def _run_in_process(
+    argv: Sequence[str], use_stdin: bool, cwd: str, source: str = None
+) -> utils.RunResult:
+    """Runs pylint in this process the way `python -m pylint` does, calling its
+    entry point directly rather than re-executing `pylint.__main__`."""
+    return utils.run_api(
+        callback=_run_pylint_entry_point,
+        argv=argv,
+        use_stdin=use_stdin,
+        cwd=cwd,
+        source=source,
+    )
+
+
+def _run_pylint_entry_point(_argv: Sequence[str], *_streams: Any) -> None:
+    # Called under `utils.CWD_LOCK`. sys.path is preserved, as in
+    # `utils.run_module`, since pylint modifies it.
+    with utils.substitute_attr(sys, "path", [""] + sys.path[:]):
+        # pylint reads its arguments from `sys.argv`, set by `utils.run_api`.
+        pylint = importlib.import_module(TOOL_MODULE)
+        pylint.modify_sys_path()
+        try:
+            pylint.run_pylint()
+        except SystemExit:
+            # Caught here so that sys.path is restored.
+            pass
+
+
+def _get_updated_env(settings: Dict[str, Any]) -> Dict[str, str]:
+    """Returns the updated environment variables. The result is shared and
+    must not be modified."""
+    return _build_updated_env(
+        settings["importStrategy"],
+        tuple(settings.get("extraPaths", [])),
+        os.environ.get("PYTHONPATH", ""),
+    )
+
+
+@functools.lru_cache(maxsize=64)
+def _build_updated_env(
+    import_strategy: str, extra_paths: Tuple[str, ...], python_path: str
+) -> Dict[str, str]:
+    paths = python_path.split(os.pathsep) + list(extra_paths)
     python_paths = os.pathsep.join([p for p in paths if len(p) > 0])
 
     env = {
-        "LS_IMPORT_STRATEGY": settings["importStrategy"],
+        "LS_IMPORT_STRATEGY": import_strategy,
         "PYTHONUTF8": "1",
     }
     if python_paths:
@@ -907,6 +1421,18 @@ def _to_run_result_with_logging(rpc_result: jsonrpc.RpcRunResult) -> utils.RunRe
 # *****************************************************
 # Logging and notification.
 # *****************************************************
+# Set by the client when the server is started, it does not change afterwards.
+SHOW_NOTIFICATION = os.getenv("LS_SHOW_NOTIFICATION", "off")
+
+
+def _is_tracing(trace: Optional[lsp.TraceValues] = None) -> bool:
+    """Returns True if the client asked for verbose logs, either in `trace`
+    or with the last `$/setTrace` notification."""
+    if trace is None:
+        trace = LSP_SERVER.lsp.trace
+    return trace not in (None, lsp.TraceValues.Off)
+
+
 def log_to_output(
     message: str, msg_type: lsp.MessageType = lsp.MessageType.Log
 ) -> None:
@@ -917,21 +1443,21 @@ def log_to_output(
 def log_error(message: str) -> None:
     """Logs messages with notification on error."""
     LSP_SERVER.show_message_log(message, lsp.MessageType.Error)
-    if os.getenv("LS_SHOW_NOTIFICATION", "off") in ["onError", "onWarning", "always"]:
+    if SHOW_NOTIFICATION in ("onError", "onWarning", "always"):
         LSP_SERVER.show_message(message, lsp.MessageType.Error)
 
 
 def log_warning(message: str) -> None:
     """Logs messages with notification on warning."""
     LSP_SERVER.show_message_log(message, lsp.MessageType.Warning)
-    if os.getenv("LS_SHOW_NOTIFICATION", "off") in ["onWarning", "always"]:
+    if SHOW_NOTIFICATION in ("onWarning", "always"):
         LSP_SERVER.show_message(message, lsp.MessageType.Warning)
 
 
 def log_always(message: str) -> None:
     """Logs messages with notification."""
     LSP_SERVER.show_message_log(message, lsp.MessageType.Info)
-    if os.getenv("LS_SHOW_NOTIFICATION", "off") in ["always"]:
+    if SHOW_NOTIFICATION == "always":
         LSP_SERVER.show_message(message, lsp.MessageType.Info)
 
 
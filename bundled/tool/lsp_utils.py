@@ -3,9 +3,13 @@
 """Utility functions and classes for use with running tools over LSP."""
 from __future__ import annotations
 
+import collections
 import contextlib
 import fnmatch
+import functools
+import hashlib
 import io
+import itertools
 import os
 import os.path
 import pathlib
@@ -65,20 +69,27 @@ def _get_extensions_dir() -> List[str]:
     return []
 
 
-_stdlib_paths = set(
-    str(pathlib.Path(p).resolve())
-    for p in (
-        as_list(site.getsitepackages())
-        + as_list(site.getusersitepackages())
-        + _get_sys_config_paths()
-        + _get_extensions_dir()
+# Tuple so that `str.startswith` can check all the prefixes in a single call.
+_stdlib_paths = tuple(
+    sorted(
+        set(
+            str(pathlib.Path(p).resolve())
+            for p in (
+                as_list(site.getsitepackages())
+                + as_list(site.getusersitepackages())
+                + _get_sys_config_paths()
+                + _get_extensions_dir()
+            )
+        )
     )
 )
 
 
 def is_same_path(file_path1: str, file_path2: str) -> bool:
     """Returns true if two paths are the same."""
-    return pathlib.Path(file_path1) == pathlib.Path(file_path2)
+    norm_path1 = os.path.normcase(os.path.normpath(file_path1))
+    norm_path2 = os.path.normcase(os.path.normpath(file_path2))
+    return norm_path1 == norm_path2
 
 
 def normalize_path(file_path: str) -> str:
@@ -86,15 +97,32 @@ def normalize_path(file_path: str) -> str:
     return str(pathlib.Path(file_path).resolve())
 
 
+@functools.lru_cache(maxsize=32)
 def is_current_interpreter(executable) -> bool:
     """Returns true if the executable path is same as the current interpreter."""
     return is_same_path(executable, sys.executable)
 
 
+@functools.lru_cache(maxsize=256)
 def is_stdlib_file(file_path: str) -> bool:
     """Return True if the file belongs to the standard library."""
     normalized_path = str(pathlib.Path(file_path).resolve())
-    return any(normalized_path.startswith(path) for path in _stdlib_paths)
+    return normalized_path.startswith(_stdlib_paths)
+
+
+# Directories holding installed or vendored code, in any environment.
+_VENDORED_DIRS = frozenset(
+    os.path.normcase(name)
+    for name in ("site-packages", "dist-packages", "node_modules", ".venv")
+)
+
+
+@functools.lru_cache(maxsize=256)
+def is_vendored_file(file_path: str) -> bool:
+    """Return True if the file belongs to installed packages or a virtual
+    environment, for any interpreter."""
+    parts = os.path.normcase(os.path.dirname(file_path)).split(os.sep)
+    return not _VENDORED_DIRS.isdisjoint(parts)
 
 
 def is_match(patterns: List[str], file_path: str) -> bool:
@@ -113,6 +141,41 @@ class RunResult:
         self.stderr = stderr
 
 
+class LRUCache:
+    """Thread safe least recently used cache holding up to `maxsize` entries."""
+
+    def __init__(self, maxsize: int = 64):
+        self._maxsize = maxsize
+        self._data: collections.OrderedDict = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        """Returns the value for the key, marking it as recently used."""
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key: Any, value: Any) -> None:
+        """Adds the value for the key, evicting the least recently used entry."""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self._maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        """Removes all entries."""
+        with self._lock:
+            self._data.clear()
+
+
+def get_content_hash(content: str) -> bytes:
+    """Returns a short stable digest of the given content."""
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+
+
 class CustomIO(io.TextIOWrapper):
     """Custom stream object to replace stdio."""
 
@@ -132,6 +195,28 @@ class CustomIO(io.TextIOWrapper):
         self.seek(0)
         return self.read()
 
+    def reset(self) -> None:
+        """Clears the buffer so the stream can be re-used."""
+        self.seek(0)
+        self.truncate()
+
+
+# Streams re-used across runs on the same thread.
+_IO_POOL = threading.local()
+
+
+def get_custom_io(name: str) -> CustomIO:
+    """Returns an empty output stream for the given name, re-using a pooled one."""
+    pool: Dict[str, CustomIO] = getattr(_IO_POOL, "streams", None)
+    if pool is None:
+        pool = _IO_POOL.streams = {}
+    stream = pool.get(name, None)
+    if stream is not None:
+        stream.reset()
+        return stream
+    stream = pool[name] = CustomIO(name, encoding="utf-8")
+    return stream
+
 
 @contextlib.contextmanager
 def substitute_attr(obj: Any, attribute: str, new_value: Any):
@@ -151,6 +236,21 @@ def redirect_io(stream: str, new_stream):
     setattr(sys, stream, old_stream)
 
 
+@contextlib.contextmanager
+def redirect_stdio(argv: Sequence[str], stdout, stderr, stdin=None):
+    """Substitute `sys.argv` and redirect stdio streams to custom streams."""
+    old_values = (sys.argv, sys.stdin, sys.stdout, sys.stderr)
+    sys.argv = argv
+    sys.stdout = stdout
+    sys.stderr = stderr
+    if stdin is not None:
+        sys.stdin = stdin
+    try:
+        yield
+    finally:
+        sys.argv, sys.stdin, sys.stdout, sys.stderr = old_values
+
+
 @contextlib.contextmanager
 def change_cwd(new_cwd):
     """Change working directory before running code."""
@@ -174,25 +274,76 @@ class QuickFixRegistrationError(LSPServerError):
         return f'Quick Fix for "{self.diagnostic_code}" is already registered.'
 
 
+class RunCancelledError(LSPServerError):
+    """Raised when a run is cancelled before it completes."""
+
+
+# Latest executable run or cancellation for each caller provided key (i.e.
+# document uri), as its sequence number and the process while it is running.
+# A run only replaces runs that started before it, runs that started earlier
+# but get here later are cancelled instead.
+_RUNNING_PROCESSES: Dict[str, Tuple[int, Optional[subprocess.Popen]]] = {}
+_RUNNING_PROCESSES_LOCK = threading.Lock()
+_RUN_SEQUENCE = itertools.count()
+
+
+def cancel_run(key: str) -> None:
+    """Terminates the executable run registered with the given key, if any, and
+    any run with the key that started before this call."""
+    with _RUNNING_PROCESSES_LOCK:
+        _, process = _RUNNING_PROCESSES.get(key, (0, None))
+        _RUNNING_PROCESSES[key] = (next(_RUN_SEQUENCE), None)
+        if process is not None:
+            process.terminate()
+
+
+def _register_run(key: str, sequence: int, process: subprocess.Popen) -> None:
+    """Registers the process of the run with the given sequence number, unless a
+    run or cancellation with the key started after it."""
+    with _RUNNING_PROCESSES_LOCK:
+        latest, running = _RUNNING_PROCESSES.get(key, (-1, None))
+        if latest > sequence:
+            process.terminate()
+            raise RunCancelledError()
+        _RUNNING_PROCESSES[key] = (sequence, process)
+        if running is not None:
+            running.terminate()
+
+
+def _unregister_run(key: str, sequence: int) -> None:
+    """Unregisters the process of the run with the given sequence number, raising
+    `RunCancelledError` if the run was superseded or cancelled meanwhile."""
+    with _RUNNING_PROCESSES_LOCK:
+        latest, _ = _RUNNING_PROCESSES[key]
+        if latest != sequence:
+            raise RunCancelledError()
+        # The sequence number is kept, so that older runs still starting are
+        # cancelled.
+        _RUNNING_PROCESSES[key] = (sequence, None)
+
+
+def _get_stdin(use_stdin: bool, source: Optional[str]) -> Optional[CustomIO]:
+    """Returns a stream holding the source to be used as stdin, if needed."""
+    if not use_stdin or source is None:
+        return None
+    # Not pooled, pylint detaches the buffer of stdin when reading from it.
+    str_input = CustomIO("<stdin>", encoding="utf-8", newline="\n")
+    str_input.write(source)
+    str_input.seek(0)
+    return str_input
+
+
 def _run_module(
     module: str, argv: Sequence[str], use_stdin: bool, source: str = None
 ) -> RunResult:
     """Runs as a module."""
-    str_output = CustomIO("<stdout>", encoding="utf-8")
-    str_error = CustomIO("<stderr>", encoding="utf-8")
+    str_output = get_custom_io("<stdout>")
+    str_error = get_custom_io("<stderr>")
+    str_input = _get_stdin(use_stdin, source)
 
     try:
-        with substitute_attr(sys, "argv", argv):
-            with redirect_io("stdout", str_output):
-                with redirect_io("stderr", str_error):
-                    if use_stdin and source is not None:
-                        str_input = CustomIO("<stdin>", encoding="utf-8", newline="\n")
-                        with redirect_io("stdin", str_input):
-                            str_input.write(source)
-                            str_input.seek(0)
-                            runpy.run_module(module, run_name="__main__")
-                    else:
-                        runpy.run_module(module, run_name="__main__")
+        with redirect_stdio(argv, str_output, str_error, str_input):
+            runpy.run_module(module, run_name="__main__")
     except SystemExit:
         pass
 
@@ -203,7 +354,10 @@ def run_module(
     module: str, argv: Sequence[str], use_stdin: bool, cwd: str, source: str = None
 ) -> RunResult:
     """Runs as a module."""
-    with CWD_LOCK:
+    # Runs are serialized since they share the process wide cwd, stdio and
+    # sys.path. sys.path is preserved in cases where the tool modifies it and
+    # that might not work for this scenario next time around.
+    with CWD_LOCK, substitute_attr(sys, "path", [""] + sys.path[:]):
         if is_same_path(os.getcwd(), cwd):
             return _run_module(module, argv, use_stdin, source)
         with change_cwd(cwd):
@@ -216,34 +370,49 @@ def run_path(
     cwd: str,
     source: str = None,
     env: Optional[Dict[str, str]] = None,
+    key: Optional[str] = None,
 ) -> RunResult:
-    """Runs as an executable."""
+    """Runs as an executable.
+
+    If `key` is given, the run supersedes any earlier run with the same key that
+    is still in progress, and can be cancelled using `cancel_run`. A cancelled
+    run raises `RunCancelledError`.
+    """
     _env = os.environ.copy()
     if env is not None:
         _env.update(env)
 
+    # Pipes are used in binary mode, data is encoded and decoded only once here.
     if use_stdin:
+        if key is not None:
+            with _RUNNING_PROCESSES_LOCK:
+                sequence = next(_RUN_SEQUENCE)
         with subprocess.Popen(
             argv,
-            encoding="utf-8",
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             stdin=subprocess.PIPE,
             cwd=cwd,
             env=_env,
         ) as process:
-            return RunResult(*process.communicate(input=source))
+            if key is not None:
+                _register_run(key, sequence, process)
+            stdout, stderr = process.communicate(
+                input=source.encode("utf-8") if source is not None else None
+            )
+            if key is not None:
+                _unregister_run(key, sequence)
     else:
         result = subprocess.run(
             argv,
-            encoding="utf-8",
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             check=False,
             cwd=cwd,
             env=_env,
         )
-        return RunResult(result.stdout, result.stderr)
+        stdout, stderr = result.stdout, result.stderr
+    return RunResult(stdout.decode("utf-8"), stderr.decode("utf-8"))
 
 
 def run_api(
@@ -267,21 +436,16 @@ def _run_api(
     use_stdin: bool,
     source: str = None,
 ) -> RunResult:
-    str_output = CustomIO("<stdout>", encoding="utf-8")
-    str_error = CustomIO("<stderr>", encoding="utf-8")
+    str_output = get_custom_io("<stdout>")
+    str_error = get_custom_io("<stderr>")
+    str_input = _get_stdin(use_stdin, source)
 
     try:
-        with substitute_attr(sys, "argv", argv):
-            with redirect_io("stdout", str_output):
-                with redirect_io("stderr", str_error):
-                    if use_stdin and source is not None:
-                        str_input = CustomIO("<stdin>", encoding="utf-8", newline="\n")
-                        with redirect_io("stdin", str_input):
-                            str_input.write(source)
-                            str_input.seek(0)
-                            callback(argv, str_output, str_error, str_input)
-                    else:
-                        callback(argv, str_output, str_error)
+        with redirect_stdio(argv, str_output, str_error, str_input):
+            if str_input is not None:
+                callback(argv, str_output, str_error, str_input)
+            else:
+                callback(argv, str_output, str_error)
     except SystemExit:
         pass
 
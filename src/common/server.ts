@@ -13,7 +13,13 @@ import {
 import { DEBUG_SERVER_SCRIPT_PATH, SERVER_SCRIPT_PATH } from './constants';
 import { traceError, traceInfo, traceVerbose } from './logging';
 import { getDebuggerPath } from './python';
-import { getExtensionSettings, getGlobalSettings, ISettings, isLintOnChangeEnabled } from './settings';
+import {
+    getExtensionSettings,
+    getGlobalSettings,
+    ISettings,
+    isLintOnChangeEnabled,
+    isPullDiagnosticsEnabled,
+} from './settings';
 import { getLSClientTraceLevel, getDocumentSelector } from './utilities';
 import { updateStatus } from './status';
 
@@ -47,10 +53,16 @@ async function createServer(
 
     newEnv.PYTHONUTF8 = '1';
 
-    if (isLintOnChangeEnabled(serverId)) {
+    const lintOnChange = isLintOnChangeEnabled(serverId);
+    if (lintOnChange) {
         newEnv.VSCODE_PYLINT_LINT_ON_CHANGE = '1';
     }
 
+    const pullDiagnostics = isPullDiagnosticsEnabled(serverId);
+    if (pullDiagnostics) {
+        newEnv.VSCODE_PYLINT_PULL_DIAGNOSTICS = '1';
+    }
+
     const args =
         newEnv.USE_DEBUGPY === 'False' || !isDebugScript
             ? settings.interpreter.slice(1).concat([SERVER_SCRIPT_PATH])
@@ -71,6 +83,9 @@ async function createServer(
         traceOutputChannel: outputChannel,
         revealOutputChannelOn: RevealOutputChannelOn.Never,
         initializationOptions,
+        // When diagnostics are pulled, the client decides when to lint. Pull on
+        // the same events that trigger a lint otherwise.
+        diagnosticPullOptions: pullDiagnostics ? { onChange: lintOnChange, onSave: true } : undefined,
     };
 
     return new LanguageClient(serverId, serverName, serverOptions, clientOptions);
@@ -184,6 +184,11 @@ export function isLintOnChangeEnabled(namespace: string): boolean {
     return config.get<boolean>('lintOnChange', false);
 }
 
+export function isPullDiagnosticsEnabled(namespace: string): boolean {
+    const config = getConfiguration(namespace);
+    return config.get<boolean>('pullDiagnostics', false);
+}
+
 export function checkIfConfigurationChanged(e: ConfigurationChangeEvent, namespace: string): boolean {
     const settings = [
         `${namespace}.args`,
@@ -196,6 +201,7 @@ export function checkIfConfigurationChanged(e: ConfigurationChangeEvent, namespa
         `${namespace}.showNotifications`,
         `${namespace}.ignorePatterns`,
         `${namespace}.lintOnChange`,
+        `${namespace}.pullDiagnostics`,
         'python.analysis.extraPaths',
     ];
     const changed = settings.map((s) => e.affectsConfiguration(s));
@@ -0,0 +1,33 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Shared fixtures for tests over LSP.
+"""
+
+import os
+
+import pytest
+
+from .lsp_test_client import session
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _cache_home(tmp_path_factory):
+    """Points servers started by the tests at a temporary cache directory, so the
+    pylint versions they cache are not written to the user's home directory."""
+    previous = os.environ.get("XDG_CACHE_HOME", None)
+    os.environ["XDG_CACHE_HOME"] = str(tmp_path_factory.mktemp("cache"))
+    yield
+    if previous is None:
+        os.environ.pop("XDG_CACHE_HOME", None)
+    else:
+        os.environ["XDG_CACHE_HOME"] = previous
+
+
+@pytest.fixture(scope="session", name="ls_session")
+def _ls_session():
+    """Server initialized with the default settings, shared by all tests that do
+    not need their own settings or environment, so pylint is only loaded once."""
+    with session.LspSession() as ls_session:
+        ls_session.initialize()
+        yield ls_session
@@ -8,7 +8,7 @@ import os
 import subprocess
 import sys
 from concurrent.futures import Future, ThreadPoolExecutor
-from threading import Event
+from threading import Condition, Event
 
 from pyls_jsonrpc.dispatchers import MethodDispatcher
 from pyls_jsonrpc.endpoint import Endpoint
@@ -38,6 +38,9 @@ class LspSession(MethodDispatcher):
         self._reader = None
         self._endpoint = None
         self._notification_callbacks = {}
+        # Published diagnostics not yet taken with `next_diagnostics`.
+        self._diagnostics = []
+        self._diagnostics_condition = Condition()
         self.script = (
             script if script else (PROJECT_ROOT / "bundled" / "tool" / "lsp_server.py")
         )
@@ -142,11 +145,27 @@ class LspSession(MethodDispatcher):
         """Sends did close notification to LSP Server."""
         self._send_notification("textDocument/didClose", params=did_close_params)
 
+    def notify_did_change_workspace_folders(self, did_change_params):
+        """Sends did change workspace folders notification to LSP Server."""
+        self._send_notification(
+            "workspace/didChangeWorkspaceFolders", params=did_change_params
+        )
+
     def text_document_formatting(self, formatting_params):
         """Sends text document format request to LSP server."""
         fut = self._send_request("textDocument/formatting", params=formatting_params)
         return fut.result()
 
+    def text_document_diagnostic(self, diagnostic_params):
+        """Sends text document diagnostic request to LSP server."""
+        fut = self._send_request("textDocument/diagnostic", params=diagnostic_params)
+        return fut.result()
+
+    def send_text_document_diagnostic(self, diagnostic_params):
+        """Sends text document diagnostic request to LSP server, returning the
+        future of the response without waiting for it."""
+        return self._send_request("textDocument/diagnostic", params=diagnostic_params)
+
     def text_document_code_action(self, code_action_params):
         """Sends text document code actions request to LSP server."""
         fut = self._send_request("textDocument/codeAction", params=code_action_params)
@@ -175,8 +194,29 @@ class LspSession(MethodDispatcher):
 
             return _default_handler
 
+    def next_diagnostics(self, uri, timeout):
+        """Returns the oldest diagnostics published for the uri that have not been
+        returned yet, waiting up to `timeout` seconds for them. Returns None on
+        timeout."""
+
+        def _find():
+            for index, params in enumerate(self._diagnostics):
+                if params["uri"] == uri:
+                    return index
+            return None
+
+        with self._diagnostics_condition:
+            if not self._diagnostics_condition.wait_for(
+                lambda: _find() is not None, timeout
+            ):
+                return None
+            return self._diagnostics.pop(_find())
+
     def _publish_diagnostics(self, publish_diagnostics_params):
         """Internal handler for text document publish diagnostics."""
+        with self._diagnostics_condition:
+            self._diagnostics.append(publish_diagnostics_params)
+            self._diagnostics_condition.notify_all()
         return self._handle_notification(
             PUBLISH_DIAGNOSTICS, publish_diagnostics_params
         )
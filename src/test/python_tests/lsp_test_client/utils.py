@@ -4,6 +4,8 @@
 Utility functions for use with tests.
 """
 import contextlib
+import copy
+import functools
 import json
 import os
 import pathlib
@@ -39,17 +41,21 @@ def python_file(contents: str, root: pathlib.Path, ext: str = ".py"):
         os.unlink(str(fullpath))
 
 
+@functools.lru_cache(maxsize=1)
+def _get_package_json():
+    """Returns package.json, read once per test run."""
+    package_json_path = PROJECT_ROOT / "package.json"
+    return json.loads(package_json_path.read_text())
+
+
 def get_server_info_defaults():
     """Returns server info from package.json"""
-    package_json_path = PROJECT_ROOT / "package.json"
-    package_json = json.loads(package_json_path.read_text())
-    return package_json["serverInfo"]
+    return _get_package_json()["serverInfo"]
 
 
 def get_initialization_options():
     """Returns initialization options from package.json"""
-    package_json_path = PROJECT_ROOT / "package.json"
-    package_json = json.loads(package_json_path.read_text())
+    package_json = _get_package_json()
 
     server_info = package_json["serverInfo"]
     server_id = server_info["module"]
@@ -58,8 +64,8 @@ def get_initialization_options():
     setting = {}
     for prop in properties:
         name = prop[len(server_id) + 1 :]
-        value = properties[prop]["default"]
-        setting[name] = value
+        # Copied, tests modify the settings they are given.
+        setting[name] = copy.deepcopy(properties[prop]["default"])
 
     setting["workspace"] = as_uri(str(PROJECT_ROOT))
     setting["interpreter"] = []
@@ -4,6 +4,7 @@
 Test for code actions over LSP.
 """
 
+import contextlib
 import os
 from threading import Event
 
@@ -16,19 +17,62 @@ TEST_FILE_PATH = constants.TEST_DATA / "sample1" / "sample.py"
 TEST_FILE_URI = utils.as_uri(str(TEST_FILE_PATH))
 LINTER = utils.get_server_info_defaults()["name"]
 TIMEOUT = 10  # 10 seconds
-
-
-def _expected_format_command():
+EXPECTED_FORMAT_COMMAND = {
+    "title": f"{LINTER}: Run document formatting",
+    "command": "editor.action.formatDocument",
+}
+EXPECTED_ORGANIZE_IMPORTS_COMMAND = {
+    "title": f"{LINTER}: Run organize imports",
+    "command": "editor.action.organizeImports",
+}
+
+
+@contextlib.contextmanager
+def _opened_document(ls_session, uri, contents, code):
+    """Opens the document and yields its diagnostics with the given code."""
+    diagnostics = []
+    done = Event()
+
+    def _handler(params):
+        nonlocal diagnostics
+        # Ignore diagnostics for documents of earlier cases, and wait for the
+        # ones of interest rather than the first batch published.
+        if params["uri"] != uri or done.is_set():
+            return
+        matching = [d for d in params["diagnostics"] if d["code"] == code]
+        if matching:
+            # Later batches must not replace the one being tested.
+            diagnostics = matching
+            done.set()
+
+    ls_session.set_notification_callback(session.PUBLISH_DIAGNOSTICS, _handler)
+
+    ls_session.notify_did_open(
+        {
+            "textDocument": {
+                "uri": uri,
+                "languageId": "python",
+                "version": 1,
+                "text": contents,
+            }
+        }
+    )
+    try:
+        # TIMEOUT is only reached if the expected diagnostic never arrives.
+        done.wait(TIMEOUT)
+
+        yield diagnostics
+    finally:
+        # Closed so that the next case starts from a clean server state.
+        ls_session.notify_did_close({"textDocument": {"uri": uri}})
+
+
+def _expected_command_action(command, diagnostic):
     return {
-        "title": f"{LINTER}: Run document formatting",
-        "command": "editor.action.formatDocument",
-    }
-
-
-def _expected_organize_imports_command():
-    return {
-        "title": f"{LINTER}: Run organize imports",
-        "command": "editor.action.organizeImports",
+        "title": command["title"],
+        "kind": "quickfix",
+        "diagnostics": [diagnostic],
+        "command": command,
     }
 
 
@@ -39,80 +83,52 @@ def _expected_organize_imports_command():
             "C0301:line-too-long",
             # pylint: disable=line-too-long
             "FRUIT = ['apricot', 'blackcurrant', 'cantaloupe', 'dragon fruit', 'elderberry', 'fig', 'grapefruit', 'honeydew melon', 'jackfruit', 'kiwi', 'lemon', 'mango', 'nectarine', 'orange', 'papaya', 'quince', 'raspberry', 'strawberry', 'tangerine', 'watermelon']\n",
-            _expected_format_command(),
+            EXPECTED_FORMAT_COMMAND,
         ),
         (
             "C0303:trailing-whitespace",
             "x =  1    \ny = 1\n",
-            _expected_format_command(),
+            EXPECTED_FORMAT_COMMAND,
         ),
         (
             "C0304:missing-final-newline",
             "print('hello')",
-            _expected_format_command(),
+            EXPECTED_FORMAT_COMMAND,
         ),
         (
             "C0305:trailing-newlines",
             "VEGGIE = ['carrot', 'radish', 'cucumber', 'potato']\n\n\n",
-            _expected_format_command(),
+            EXPECTED_FORMAT_COMMAND,
         ),
         (
             "C0321:multiple-statements",
             "import sys; print(sys.executable)\n",
-            _expected_format_command(),
+            EXPECTED_FORMAT_COMMAND,
         ),
         (
             "C0410:multiple-imports",
             "import os, sys\n",
-            _expected_organize_imports_command(),
+            EXPECTED_ORGANIZE_IMPORTS_COMMAND,
         ),
         (
             "C0411:wrong-import-order",
             "import os\nfrom . import utils\nimport pylint\nimport sys\n",
-            _expected_organize_imports_command(),
+            EXPECTED_ORGANIZE_IMPORTS_COMMAND,
         ),
         (
             "C0412:ungrouped-imports",
             # pylint: disable=line-too-long
             "import logging\nimport os\nimport sys\nimport logging.config\nfrom logging.handlers import WatchedFileHandler\n",
-            _expected_organize_imports_command(),
+            EXPECTED_ORGANIZE_IMPORTS_COMMAND,
         ),
     ],
 )
-def test_command_code_action(code, contents, command):
+def test_command_code_action(ls_session, code, contents, command):
     """Tests for code actions which run a command."""
     with utils.python_file(contents, TEST_FILE_PATH.parent) as temp_file:
         uri = utils.as_uri(os.fspath(temp_file))
 
-        actual = {}
-        with session.LspSession() as ls_session:
-            ls_session.initialize()
-
-            done = Event()
-
-            def _handler(params):
-                nonlocal actual
-                actual = params
-                done.set()
-
-            ls_session.set_notification_callback(session.PUBLISH_DIAGNOSTICS, _handler)
-
-            ls_session.notify_did_open(
-                {
-                    "textDocument": {
-                        "uri": uri,
-                        "languageId": "python",
-                        "version": 1,
-                        "text": contents,
-                    }
-                }
-            )
-
-            # wait for some time to receive all notifications
-            done.wait(TIMEOUT)
-
-            diagnostics = [d for d in actual["diagnostics"] if d["code"] == code]
-
+        with _opened_document(ls_session, uri, contents, code) as diagnostics:
             assert_that(len(diagnostics), is_(greater_than(0)))
 
             actual_code_actions = ls_session.text_document_code_action(
@@ -126,15 +142,7 @@ def test_command_code_action(code, contents, command):
                 }
             )
 
-            expected = [
-                {
-                    "title": command["title"],
-                    "kind": "quickfix",
-                    "diagnostics": [d],
-                    "command": command,
-                }
-                for d in diagnostics
-            ]
+            expected = [_expected_command_action(command, d) for d in diagnostics]
 
         assert_that(actual_code_actions, is_(expected))
 
@@ -261,40 +269,12 @@ for city, population in data:
         ),
     ],
 )
-def test_edit_code_action(code, contents, new_text):
+def test_edit_code_action(ls_session, code, contents, new_text):
     """Tests for code actions which run a command."""
     with utils.python_file(contents, TEST_FILE_PATH.parent) as temp_file:
         uri = utils.as_uri(os.fspath(temp_file))
 
-        actual = {}
-        with session.LspSession() as ls_session:
-            ls_session.initialize()
-
-            done = Event()
-
-            def _handler(params):
-                nonlocal actual
-                actual = params
-                done.set()
-
-            ls_session.set_notification_callback(session.PUBLISH_DIAGNOSTICS, _handler)
-
-            ls_session.notify_did_open(
-                {
-                    "textDocument": {
-                        "uri": uri,
-                        "languageId": "python",
-                        "version": 1,
-                        "text": contents,
-                    }
-                }
-            )
-
-            # wait for some time to receive all notifications
-            done.wait(TIMEOUT)
-
-            diagnostics = [d for d in actual["diagnostics"] if d["code"] == code]
-
+        with _opened_document(ls_session, uri, contents, code) as diagnostics:
             assert_that(len(diagnostics), is_(greater_than(0)))
 
             actual_code_actions = ls_session.text_document_code_action(
@@ -0,0 +1,32 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Test for the JSON-RPC messages exchanged with the runner.
+"""
+
+import io
+import os
+import sys
+
+import pytest
+from hamcrest import assert_that, is_
+
+from .lsp_test_client import constants
+
+sys.path.insert(0, os.fspath(constants.PROJECT_ROOT / "bundled" / "tool"))
+import lsp_jsonrpc  # pylint: disable=wrong-import-position
+
+
+@pytest.mark.parametrize(
+    "source", ["x = 1\n", "x = 'café \U0001f600'\n", "x = '\ud800'\n"]
+)
+def test_message_round_trip(source: str):
+    """Test to ensure messages are read back as written, including sources with
+    lone surrogates."""
+    message = {"id": "1", "method": "run", "source": source}
+
+    stream = io.BytesIO()
+    lsp_jsonrpc.JsonWriter(stream).write(message)
+    stream.seek(0)
+
+    assert_that(lsp_jsonrpc.JsonReader(stream).read(), is_(message))
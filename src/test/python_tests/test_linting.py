@@ -4,7 +4,12 @@
 Test for linting over LSP.
 """
 
+import json
 import os
+import pathlib
+import sys
+import tempfile
+import time
 from threading import Event
 from typing import List
 
@@ -17,257 +22,339 @@ TEST_FILE_PATH = constants.TEST_DATA / "sample1" / "sample.py"
 TEST_FILE2_PATH = constants.TEST_DATA / "sample2" / "sample.py"
 TEST_FILE_URI = utils.as_uri(str(TEST_FILE_PATH))
 TEST_FILE2_URI = utils.as_uri(str(TEST_FILE2_PATH))
+TEST_FILE_CONTENTS = TEST_FILE_PATH.read_text(encoding="utf-8")
+TEST_FILE2_CONTENTS = TEST_FILE2_PATH.read_text(encoding="utf-8")
 LINTER = utils.get_server_info_defaults()
 TIMEOUT = 10  # 10 seconds
+# Just over the delay the server waits before linting a document.
+LINT_START_DELAY = 0.3
+# Upper bound of the time pylint takes to lint the sample.
+LINT_DURATION = 3
 DOCUMENTATION_HOME = "https://pylint.readthedocs.io/en/latest/user_guide/messages"
 
 
-def test_publish_diagnostics_on_open():
-    """Test to ensure linting on file open."""
-    contents = TEST_FILE_PATH.read_text(encoding="utf-8")
+def _expected_sample_diagnostics(unused_import_severity=2):
+    """Diagnostics expected for the sample1 document with default settings."""
+    return [
+        {
+            "range": {
+                "start": {"line": 0, "character": 0},
+                "end": {"line": 0, "character": 0},
+            },
+            "message": "Missing module docstring",
+            "severity": 3,
+            "code": "C0114:missing-module-docstring",
+            "codeDescription": {
+                "href": f"{DOCUMENTATION_HOME}/convention/missing-module-docstring.html"
+            },
+            "source": LINTER["name"],
+        },
+        {
+            "range": {
+                "start": {"line": 2, "character": 6},
+                "end": {
+                    "line": 2,
+                    "character": 7,
+                },
+            },
+            "message": "Undefined variable 'x'",
+            "severity": 1,
+            "code": "E0602:undefined-variable",
+            "codeDescription": {
+                "href": f"{DOCUMENTATION_HOME}/error/undefined-variable.html"
+            },
+            "source": LINTER["name"],
+        },
+        {
+            "range": {
+                "start": {"line": 0, "character": 0},
+                "end": {
+                    "line": 0,
+                    "character": 10,
+                },
+            },
+            "message": "Unused import sys",
+            "severity": unused_import_severity,
+            "code": "W0611:unused-import",
+            "codeDescription": {
+                "href": f"{DOCUMENTATION_HOME}/warning/unused-import.html"
+            },
+            "source": LINTER["name"],
+        },
+    ]
 
+
+def _close_document(ls_session, uri):
+    """Closes the document on the shared session, waiting for its diagnostics to
+    be cleared so that they do not reach the handler of a later test."""
+    closed = Event()
+
+    def _handler(params):
+        if params["uri"] == uri and not params["diagnostics"]:
+            closed.set()
+
+    ls_session.set_notification_callback(session.PUBLISH_DIAGNOSTICS, _handler)
+    ls_session.notify_did_close({"textDocument": {"uri": uri}})
+    closed.wait(TIMEOUT)
+
+
+@pytest.mark.parametrize("trigger", ["did_open", "did_save"])
+def test_publish_diagnostics(ls_session, trigger):
+    """Test to ensure linting on file open and on file save."""
     actual = []
-    with session.LspSession() as ls_session:
-        ls_session.initialize()
+    done = Event()
 
-        done = Event()
+    # A file of its own for each trigger, so that its diagnostics come from a
+    # run of pylint rather than the results cached for the other trigger.
+    with utils.python_file(TEST_FILE_CONTENTS, TEST_FILE_PATH.parent) as file_path:
+        uri = utils.as_uri(str(file_path))
 
         def _handler(params):
             nonlocal actual
-            actual = params
-            done.set()
+            if params["uri"] == uri:
+                actual = params
+                done.set()
 
         ls_session.set_notification_callback(session.PUBLISH_DIAGNOSTICS, _handler)
 
-        ls_session.notify_did_open(
+        notify = getattr(ls_session, f"notify_{trigger}")
+        notify(
             {
                 "textDocument": {
-                    "uri": TEST_FILE_URI,
+                    "uri": uri,
                     "languageId": "python",
                     "version": 1,
-                    "text": contents,
+                    "text": TEST_FILE_CONTENTS,
                 }
             }
         )
-
-        # wait for some time to receive all notifications
-        done.wait(TIMEOUT)
+        try:
+            # wait for some time to receive all notifications
+            done.wait(TIMEOUT)
+        finally:
+            _close_document(ls_session, uri)
 
     expected = {
-        "uri": TEST_FILE_URI,
-        "diagnostics": [
-            {
-                "range": {
-                    "start": {"line": 0, "character": 0},
-                    "end": {"line": 0, "character": 0},
-                },
-                "message": "Missing module docstring",
-                "severity": 3,
-                "code": "C0114:missing-module-docstring",
-                "codeDescription": {
-                    "href": f"{DOCUMENTATION_HOME}/convention/missing-module-docstring.html"
-                },
-                "source": LINTER["name"],
-            },
-            {
-                "range": {
-                    "start": {"line": 2, "character": 6},
-                    "end": {
-                        "line": 2,
-                        "character": 7,
-                    },
-                },
-                "message": "Undefined variable 'x'",
-                "severity": 1,
-                "code": "E0602:undefined-variable",
-                "codeDescription": {
-                    "href": f"{DOCUMENTATION_HOME}/error/undefined-variable.html"
-                },
-                "source": LINTER["name"],
-            },
-            {
-                "range": {
-                    "start": {"line": 0, "character": 0},
-                    "end": {
-                        "line": 0,
-                        "character": 10,
-                    },
-                },
-                "message": "Unused import sys",
-                "severity": 2,
-                "code": "W0611:unused-import",
-                "codeDescription": {
-                    "href": f"{DOCUMENTATION_HOME}/warning/unused-import.html"
-                },
-                "source": LINTER["name"],
-            },
-        ],
+        "uri": uri,
+        "diagnostics": _expected_sample_diagnostics(),
     }
 
     assert_that(actual, is_(expected))
 
 
-def test_publish_diagnostics_on_save():
-    """Test to ensure linting on file save."""
-    contents = TEST_FILE_PATH.read_text(encoding="utf-8")
+def test_publish_diagnostics_on_close(ls_session):
+    """Test to ensure diagnostic clean-up on file close."""
+    contents = TEST_FILE_CONTENTS
 
     actual = []
-    with session.LspSession() as ls_session:
-        ls_session.initialize()
+    done = Event()
 
-        done = Event()
-
-        def _handler(params):
-            nonlocal actual
+    def _handler(params):
+        nonlocal actual
+        if params["uri"] == TEST_FILE_URI:
             actual = params
             done.set()
 
-        ls_session.set_notification_callback(session.PUBLISH_DIAGNOSTICS, _handler)
+    ls_session.set_notification_callback(session.PUBLISH_DIAGNOSTICS, _handler)
 
-        ls_session.notify_did_save(
-            {
-                "textDocument": {
-                    "uri": TEST_FILE_URI,
-                    "languageId": "python",
-                    "version": 1,
-                    "text": contents,
-                }
+    ls_session.notify_did_open(
+        {
+            "textDocument": {
+                "uri": TEST_FILE_URI,
+                "languageId": "python",
+                "version": 1,
+                "text": contents,
             }
-        )
-
-        # wait for some time to receive all notifications
-        done.wait(TIMEOUT)
+        }
+    )
 
-    expected = {
-        "uri": TEST_FILE_URI,
-        "diagnostics": [
-            {
-                "range": {
-                    "start": {"line": 0, "character": 0},
-                    "end": {"line": 0, "character": 0},
-                },
-                "message": "Missing module docstring",
-                "severity": 3,
-                "code": "C0114:missing-module-docstring",
-                "codeDescription": {
-                    "href": f"{DOCUMENTATION_HOME}/convention/missing-module-docstring.html"
-                },
-                "source": LINTER["name"],
-            },
-            {
-                "range": {
-                    "start": {"line": 2, "character": 6},
-                    "end": {
-                        "line": 2,
-                        "character": 7,
-                    },
-                },
-                "message": "Undefined variable 'x'",
-                "severity": 1,
-                "code": "E0602:undefined-variable",
-                "codeDescription": {
-                    "href": f"{DOCUMENTATION_HOME}/error/undefined-variable.html"
-                },
-                "source": LINTER["name"],
-            },
-            {
-                "range": {
-                    "start": {"line": 0, "character": 0},
-                    "end": {
-                        "line": 0,
-                        "character": 10,
-                    },
-                },
-                "message": "Unused import sys",
-                "severity": 2,
-                "code": "W0611:unused-import",
-                "codeDescription": {
-                    "href": f"{DOCUMENTATION_HOME}/warning/unused-import.html"
-                },
-                "source": LINTER["name"],
-            },
-        ],
-    }
+    # wait for some time to receive all notifications
+    done.wait(TIMEOUT)
 
-    assert_that(actual, is_(expected))
+    # We should receive some diagnostics
+    assert_that(len(actual), is_(greater_than(0)))
 
+    # reset waiting
+    done.clear()
 
-def test_publish_diagnostics_on_close():
-    """Test to ensure diagnostic clean-up on file close."""
-    contents = TEST_FILE_PATH.read_text(encoding="utf-8")
+    ls_session.notify_did_close(
+        {
+            "textDocument": {
+                "uri": TEST_FILE_URI,
+                "languageId": "python",
+                "version": 1,
+            }
+        }
+    )
 
-    actual = []
-    with session.LspSession() as ls_session:
-        ls_session.initialize()
+    # wait for some time to receive all notifications
+    done.wait(TIMEOUT)
 
-        done = Event()
+    # On close should clear out everything
+    expected = {
+        "uri": TEST_FILE_URI,
+        "diagnostics": [],
+    }
+    assert_that(actual, is_(expected))
 
-        def _handler(params):
-            nonlocal actual
-            actual = params
-            done.set()
 
-        ls_session.set_notification_callback(session.PUBLISH_DIAGNOSTICS, _handler)
+def test_publish_diagnostics_on_save_after_import_changes(ls_session):
+    """Test to ensure saving re-lints the document even if only a module it
+    imports has changed."""
+    # Inside the workspace, so that pylint clears its cache after each run.
+    with tempfile.TemporaryDirectory(dir=constants.TEST_DATA) as temp_dir:
+        root = pathlib.Path(temp_dir)
+        (root / "b.py").write_text('"""Module b."""\n', encoding="utf-8")
+        uri = utils.as_uri(str(root / "a.py"))
 
         ls_session.notify_did_open(
             {
                 "textDocument": {
-                    "uri": TEST_FILE_URI,
+                    "uri": uri,
                     "languageId": "python",
                     "version": 1,
-                    "text": contents,
+                    "text": "from b import foo\n\nprint(foo)\n",
                 }
             }
         )
+        try:
+            actual = ls_session.next_diagnostics(uri, TIMEOUT)
+            codes = [d["code"] for d in actual["diagnostics"]]
+            assert_that("E0611:no-name-in-module" in codes, is_(True))
 
-        # wait for some time to receive all notifications
-        done.wait(TIMEOUT)
+            (root / "b.py").write_text('"""Module b."""\n\nfoo = 1\n', encoding="utf-8")
+            ls_session.notify_did_save({"textDocument": {"uri": uri}})
+
+            actual = ls_session.next_diagnostics(uri, TIMEOUT)
+            codes = [d["code"] for d in actual["diagnostics"]]
+            assert_that("E0611:no-name-in-module" in codes, is_(False))
+        finally:
+            _close_document(ls_session, uri)
+
+
+# Pylint plugin holding up linting until the test lets it go.
+BLOCKING_PLUGIN = """
+import pathlib
+import time
+
+from pylint.checkers import BaseChecker
 
-        # We should receive some diagnostics
-        assert_that(len(actual), is_(greater_than(0)))
+STARTED = pathlib.Path({started!r})
+RELEASE = pathlib.Path({release!r})
 
-        # reset waiting
-        done.clear()
 
-        ls_session.notify_did_close(
+class BlockingChecker(BaseChecker):
+    name = "blocking"
+    # Checkers without enabled messages are not run.
+    msgs = {{"W9901": ("Never emitted", "blocking", "Never emitted.")}}
+
+    def open(self):
+        STARTED.touch()
+        deadline = time.monotonic() + {timeout}
+        while not RELEASE.exists() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+def register(linter):
+    linter.register_checker(BlockingChecker(linter))
+"""
+
+
+def _wait_for_file(path: pathlib.Path) -> bool:
+    deadline = time.monotonic() + TIMEOUT
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return path.exists()
+
+
+def test_no_diagnostics_after_close_during_lint():
+    """Test to ensure a lint still running when its document is closed does not
+    publish diagnostics for it."""
+    with tempfile.TemporaryDirectory(dir=constants.TEST_DATA) as temp_dir:
+        root = pathlib.Path(temp_dir)
+        started = root / "started"
+        release = root / "release"
+        (root / "blocking_plugin.py").write_text(
+            BLOCKING_PLUGIN.format(
+                started=str(started), release=str(release), timeout=TIMEOUT
+            ),
+            encoding="utf-8",
+        )
+        file_path = root / "sample.py"
+        file_path.write_text(TEST_FILE_CONTENTS, encoding="utf-8")
+        uri = utils.as_uri(str(file_path))
+
+        default_init = defaults.vscode_initialize_defaults()
+        init_options = default_init["initializationOptions"]
+        init_options["settings"][0]["args"] = ["--load-plugins=blocking_plugin"]
+        init_options["settings"][0]["extraPaths"] = [temp_dir]
+
+        with session.LspSession() as ls_session:
+            ls_session.initialize(default_init)
+            ls_session.notify_did_open(
+                {
+                    "textDocument": {
+                        "uri": uri,
+                        "languageId": "python",
+                        "version": 1,
+                        "text": TEST_FILE_CONTENTS,
+                    }
+                }
+            )
+            try:
+                assert_that(_wait_for_file(started), is_(True))
+                ls_session.notify_did_close({"textDocument": {"uri": uri}})
+                actual = ls_session.next_diagnostics(uri, TIMEOUT)
+                assert_that(actual, is_({"uri": uri, "diagnostics": []}))
+            finally:
+                # The close was handled, let the lint finish.
+                release.touch()
+
+            # Nothing may be published once the diagnostics have been cleared.
+            assert_that(ls_session.next_diagnostics(uri, LINT_DURATION), is_(None))
+
+
+@pytest.mark.parametrize(
+    ("folder", "expected"),
+    [
+        (".venv/lib/site-packages", []),
+        ("my.venv_tools", _expected_sample_diagnostics()),
+    ],
+)
+def test_vendored_files_skipped(ls_session, folder: str, expected):
+    """Test to ensure files of installed packages and virtual environments are
+    not linted, and that only folders with exactly those names are skipped."""
+    with tempfile.TemporaryDirectory(dir=constants.TEST_DATA) as temp_dir:
+        root = pathlib.Path(temp_dir) / folder
+        root.mkdir(parents=True)
+        uri = utils.as_uri(str(root / "sample.py"))
+
+        ls_session.notify_did_open(
             {
                 "textDocument": {
-                    "uri": TEST_FILE_URI,
+                    "uri": uri,
                     "languageId": "python",
                     "version": 1,
+                    "text": TEST_FILE_CONTENTS,
                 }
             }
         )
+        try:
+            actual = ls_session.next_diagnostics(uri, TIMEOUT)
+        finally:
+            _close_document(ls_session, uri)
 
-        # wait for some time to receive all notifications
-        done.wait(TIMEOUT)
-
-    # On close should clear out everything
-    expected = {
-        "uri": TEST_FILE_URI,
-        "diagnostics": [],
-    }
-    assert_that(actual, is_(expected))
+    assert_that(actual["diagnostics"], is_(expected))
 
 
 def test_publish_diagnostics_on_change():
     """Test to ensure diagnostic clean-up on file close."""
-    contents = TEST_FILE2_PATH.read_text(encoding="utf-8")
+    contents = TEST_FILE2_CONTENTS
 
-    actual = []
     os.environ["VSCODE_PYLINT_LINT_ON_CHANGE"] = "1"
     with session.LspSession() as ls_session:
         ls_session.initialize()
 
-        done = Event()
-
-        def _handler(params):
-            nonlocal actual
-            actual = params
-            done.set()
-
-        ls_session.set_notification_callback(session.PUBLISH_DIAGNOSTICS, _handler)
-
         ls_session.notify_did_open(
             {
                 "textDocument": {
@@ -278,8 +365,8 @@ def test_publish_diagnostics_on_change():
                 }
             }
         )
-        # wait for some time to receive all notifications
-        done.wait(TIMEOUT)
+        # wait for the next diagnostics published for this document
+        actual = ls_session.next_diagnostics(TEST_FILE2_URI, TIMEOUT)
 
         # We should receive empty diagnostics
         assert_that(
@@ -292,9 +379,6 @@ def test_publish_diagnostics_on_change():
             ),
         )
 
-        # reset waiting
-        done.clear()
-
         # make code change with linting errors
         ls_session.notify_did_change(
             {
@@ -314,8 +398,8 @@ def test_publish_diagnostics_on_change():
             }
         )
 
-        # wait for some time to receive all notifications
-        done.wait(TIMEOUT)
+        # wait for the next diagnostics published for this document
+        actual = ls_session.next_diagnostics(TEST_FILE2_URI, TIMEOUT)
 
         expected = {
             "uri": TEST_FILE2_URI,
@@ -353,9 +437,6 @@ def test_publish_diagnostics_on_change():
         }
         assert_that(actual, is_(expected))
 
-        # reset waiting
-        done.clear()
-
         # make code change fixing linting errors
         ls_session.notify_did_change(
             {
@@ -375,8 +456,8 @@ def test_publish_diagnostics_on_change():
             }
         )
 
-        # wait for some time to receive all notifications
-        done.wait(TIMEOUT)
+        # wait for the next diagnostics published for this document
+        actual = ls_session.next_diagnostics(TEST_FILE2_URI, TIMEOUT)
 
         # We should receive empty diagnostics
         assert_that(
@@ -390,10 +471,217 @@ def test_publish_diagnostics_on_change():
         )
 
 
+def test_pull_diagnostics():
+    """Test to ensure diagnostics are reported when pulled by the client."""
+    contents = TEST_FILE_CONTENTS
+
+    published = []
+    os.environ["VSCODE_PYLINT_PULL_DIAGNOSTICS"] = "1"
+    try:
+        with session.LspSession() as ls_session:
+            ls_session.initialize()
+
+            ls_session.set_notification_callback(
+                session.PUBLISH_DIAGNOSTICS, published.append
+            )
+
+            ls_session.notify_did_open(
+                {
+                    "textDocument": {
+                        "uri": TEST_FILE_URI,
+                        "languageId": "python",
+                        "version": 1,
+                        "text": contents,
+                    }
+                }
+            )
+
+            report = ls_session.text_document_diagnostic(
+                {"textDocument": {"uri": TEST_FILE_URI}}
+            )
+            assert_that(report["kind"], is_("full"))
+            assert_that(
+                [item["code"] for item in report["items"]],
+                is_(
+                    [
+                        "C0114:missing-module-docstring",
+                        "E0602:undefined-variable",
+                        "W0611:unused-import",
+                    ]
+                ),
+            )
+
+            # Nothing changed, so the client's copy is still current.
+            report = ls_session.text_document_diagnostic(
+                {
+                    "textDocument": {"uri": TEST_FILE_URI},
+                    "previousResultId": report["resultId"],
+                }
+            )
+            assert_that(report["kind"], is_("unchanged"))
+    finally:
+        os.environ.pop("VSCODE_PYLINT_PULL_DIAGNOSTICS", None)
+
+    # Diagnostics are not pushed when the client pulls them.
+    assert_that(published, is_([]))
+
+
+def test_pull_diagnostics_superseded():
+    """Test to ensure a pull superseded by a newer one is cancelled, rather than
+    answered with a report that would clear the client's diagnostics."""
+    slow_linter = "import sys, time\nsys.stdin.read()\ntime.sleep(2)\nprint('[]')\n"
+
+    os.environ["VSCODE_PYLINT_PULL_DIAGNOSTICS"] = "1"
+    # Both pulls must be able to run at the same time.
+    os.environ["VSCODE_PYLINT_MAX_WORKERS"] = "2"
+    try:
+        with utils.python_file(slow_linter, constants.TEST_DATA) as linter:
+            with session.LspSession() as ls_session:
+                default_init = defaults.vscode_initialize_defaults()
+                init_options = default_init["initializationOptions"]
+                init_options["settings"][0]["path"] = [sys.executable, str(linter)]
+                ls_session.initialize(default_init)
+
+                ls_session.notify_did_open(
+                    {
+                        "textDocument": {
+                            "uri": TEST_FILE_URI,
+                            "languageId": "python",
+                            "version": 1,
+                            "text": TEST_FILE_CONTENTS,
+                        }
+                    }
+                )
+
+                params = {"textDocument": {"uri": TEST_FILE_URI}}
+                first = ls_session.send_text_document_diagnostic(params)
+                # Let the first run start before superseding it.
+                time.sleep(LINT_START_DELAY)
+                second = ls_session.send_text_document_diagnostic(params)
+
+                assert_that(second.result(TIMEOUT)["kind"], is_("full"))
+                # RequestCancelled
+                assert_that(first.exception(TIMEOUT).code, is_(-32800))
+    finally:
+        os.environ.pop("VSCODE_PYLINT_PULL_DIAGNOSTICS", None)
+        os.environ.pop("VSCODE_PYLINT_MAX_WORKERS", None)
+
+
+UNDEFINED_VARIABLE_REPORT = json.dumps(
+    [
+        {
+            "type": "error",
+            "module": "sample",
+            "obj": "",
+            "line": 3,
+            "column": 6,
+            "endLine": 3,
+            "endColumn": 7,
+            "path": str(TEST_FILE_PATH),
+            "symbol": "undefined-variable",
+            "message": "Undefined variable 'x'",
+            "message-id": "E0602",
+        }
+    ]
+)
+
+
+@pytest.mark.parametrize(
+    ("output", "expected"),
+    [
+        ("", []),
+        (
+            "[WARNING] Failed to load plugin [example]\n" + UNDEFINED_VARIABLE_REPORT,
+            [_expected_sample_diagnostics()[1]],
+        ),
+        (
+            # Messages can quote strings of the source with lone surrogates.
+            UNDEFINED_VARIABLE_REPORT.replace("'x'", "'x\\ud800'"),
+            [
+                {
+                    **_expected_sample_diagnostics()[1],
+                    "message": "Undefined variable 'x\ud800'",
+                }
+            ],
+        ),
+    ],
+)
+def test_publish_diagnostics_unexpected_output(output: str, expected):
+    """Test to ensure linting output with no report, with text printed before
+    the report, or with lone surrogates in the report, is parsed."""
+    linter_script = f"import sys\nsys.stdin.read()\nprint({output!r})\n"
+
+    actual = None
+    done = Event()
+
+    def _handler(params):
+        nonlocal actual
+        if params["uri"] == TEST_FILE_URI:
+            actual = params["diagnostics"]
+            done.set()
+
+    with utils.python_file(linter_script, constants.TEST_DATA) as linter:
+        with session.LspSession() as ls_session:
+            default_init = defaults.vscode_initialize_defaults()
+            init_options = default_init["initializationOptions"]
+            init_options["settings"][0]["path"] = [sys.executable, str(linter)]
+            ls_session.initialize(default_init)
+            ls_session.set_notification_callback(session.PUBLISH_DIAGNOSTICS, _handler)
+
+            ls_session.notify_did_open(
+                {
+                    "textDocument": {
+                        "uri": TEST_FILE_URI,
+                        "languageId": "python",
+                        "version": 1,
+                        "text": TEST_FILE_CONTENTS,
+                    }
+                }
+            )
+
+            done.wait(TIMEOUT)
+
+    assert_that(actual, is_(expected))
+
+
+def test_publish_diagnostics_version():
+    """Test to ensure diagnostics carry the linted document version when the
+    client supports it."""
+    contents = TEST_FILE_CONTENTS
+
+    with session.LspSession() as ls_session:
+        default_init = defaults.vscode_initialize_defaults()
+        capabilities = default_init["capabilities"]["textDocument"]
+        capabilities["publishDiagnostics"]["versionSupport"] = True
+        ls_session.initialize(default_init)
+
+        ls_session.notify_did_open(
+            {
+                "textDocument": {
+                    "uri": TEST_FILE_URI,
+                    "languageId": "python",
+                    "version": 3,
+                    "text": contents,
+                }
+            }
+        )
+
+        # wait for the next diagnostics published for this document
+        actual = ls_session.next_diagnostics(TEST_FILE_URI, TIMEOUT)
+
+    expected = {
+        "uri": TEST_FILE_URI,
+        "version": 3,
+        "diagnostics": _expected_sample_diagnostics(),
+    }
+
+    assert_that(actual, is_(expected))
+
+
 @pytest.mark.parametrize("lint_code", ["W0611", "unused-import", "warning"])
 def test_severity_setting(lint_code):
     """Test to ensure linting on file open."""
-    contents = TEST_FILE_PATH.read_text(encoding="utf-8")
+    contents = TEST_FILE_CONTENTS
 
     actual = []
     with session.LspSession() as ls_session:
@@ -427,53 +715,7 @@ def test_severity_setting(lint_code):
 
     expected = {
         "uri": TEST_FILE_URI,
-        "diagnostics": [
-            {
-                "range": {
-                    "start": {"line": 0, "character": 0},
-                    "end": {"line": 0, "character": 0},
-                },
-                "message": "Missing module docstring",
-                "severity": 3,
-                "code": "C0114:missing-module-docstring",
-                "codeDescription": {
-                    "href": f"{DOCUMENTATION_HOME}/convention/missing-module-docstring.html"
-                },
-                "source": LINTER["name"],
-            },
-            {
-                "range": {
-                    "start": {"line": 2, "character": 6},
-                    "end": {
-                        "line": 2,
-                        "character": 7,
-                    },
-                },
-                "message": "Undefined variable 'x'",
-                "severity": 1,
-                "code": "E0602:undefined-variable",
-                "codeDescription": {
-                    "href": f"{DOCUMENTATION_HOME}/error/undefined-variable.html"
-                },
-                "source": LINTER["name"],
-            },
-            {
-                "range": {
-                    "start": {"line": 0, "character": 0},
-                    "end": {
-                        "line": 0,
-                        "character": 10,
-                    },
-                },
-                "message": "Unused import sys",
-                "severity": 1,
-                "code": "W0611:unused-import",
-                "codeDescription": {
-                    "href": f"{DOCUMENTATION_HOME}/warning/unused-import.html"
-                },
-                "source": LINTER["name"],
-            },
-        ],
+        "diagnostics": _expected_sample_diagnostics(unused_import_severity=1),
     }
 
     assert_that(actual, is_(expected))
@@ -489,7 +731,7 @@ def test_severity_setting(lint_code):
 )
 def test_ignore_patterns_match(patterns: List[str]):
     """Test to ensure linter uses the ignore pattern."""
-    contents = TEST_FILE_PATH.read_text(encoding="utf-8")
+    contents = TEST_FILE_CONTENTS
 
     actual = []
     with session.LspSession() as ls_session:
@@ -539,7 +781,7 @@ def test_ignore_patterns_match(patterns: List[str]):
 )
 def test_ignore_patterns_no_match(patterns: List[str]):
     """Test to ensure linter uses the ignore pattern."""
-    contents = TEST_FILE_PATH.read_text(encoding="utf-8")
+    contents = TEST_FILE_CONTENTS
 
     actual = []
     with session.LspSession() as ls_session:
@@ -573,53 +815,7 @@ def test_ignore_patterns_no_match(patterns: List[str]):
 
     expected = {
         "uri": TEST_FILE_URI,
-        "diagnostics": [
-            {
-                "range": {
-                    "start": {"line": 0, "character": 0},
-                    "end": {"line": 0, "character": 0},
-                },
-                "message": "Missing module docstring",
-                "severity": 3,
-                "code": "C0114:missing-module-docstring",
-                "codeDescription": {
-                    "href": f"{DOCUMENTATION_HOME}/convention/missing-module-docstring.html"
-                },
-                "source": LINTER["name"],
-            },
-            {
-                "range": {
-                    "start": {"line": 2, "character": 6},
-                    "end": {
-                        "line": 2,
-                        "character": 7,
-                    },
-                },
-                "message": "Undefined variable 'x'",
-                "severity": 1,
-                "code": "E0602:undefined-variable",
-                "codeDescription": {
-                    "href": f"{DOCUMENTATION_HOME}/error/undefined-variable.html"
-                },
-                "source": LINTER["name"],
-            },
-            {
-                "range": {
-                    "start": {"line": 0, "character": 0},
-                    "end": {
-                        "line": 0,
-                        "character": 10,
-                    },
-                },
-                "message": "Unused import sys",
-                "severity": 2,
-                "code": "W0611:unused-import",
-                "codeDescription": {
-                    "href": f"{DOCUMENTATION_HOME}/warning/unused-import.html"
-                },
-                "source": LINTER["name"],
-            },
-        ],
+        "diagnostics": _expected_sample_diagnostics(),
     }
 
     assert_that(actual, is_(expected))
@@ -628,7 +824,7 @@ def test_ignore_patterns_no_match(patterns: List[str]):
 @pytest.mark.parametrize("enabled", (True, False))
 def test_enabled_setting(enabled):
     """Test to ensure enabled setting is honored."""
-    contents = TEST_FILE_PATH.read_text(encoding="utf-8")
+    contents = TEST_FILE_CONTENTS
 
     actual = []
     with session.LspSession() as ls_session:
@@ -663,53 +859,7 @@ def test_enabled_setting(enabled):
     if enabled:
         expected = {
             "uri": TEST_FILE_URI,
-            "diagnostics": [
-                {
-                    "range": {
-                        "start": {"line": 0, "character": 0},
-                        "end": {"line": 0, "character": 0},
-                    },
-                    "message": "Missing module docstring",
-                    "severity": 3,
-                    "code": "C0114:missing-module-docstring",
-                    "codeDescription": {
-                        "href": f"{DOCUMENTATION_HOME}/convention/missing-module-docstring.html"
-                    },
-                    "source": LINTER["name"],
-                },
-                {
-                    "range": {
-                        "start": {"line": 2, "character": 6},
-                        "end": {
-                            "line": 2,
-                            "character": 7,
-                        },
-                    },
-                    "message": "Undefined variable 'x'",
-                    "severity": 1,
-                    "code": "E0602:undefined-variable",
-                    "codeDescription": {
-                        "href": f"{DOCUMENTATION_HOME}/error/undefined-variable.html"
-                    },
-                    "source": LINTER["name"],
-                },
-                {
-                    "range": {
-                        "start": {"line": 0, "character": 0},
-                        "end": {
-                            "line": 0,
-                            "character": 10,
-                        },
-                    },
-                    "message": "Unused import sys",
-                    "severity": 2,
-                    "code": "W0611:unused-import",
-                    "codeDescription": {
-                        "href": f"{DOCUMENTATION_HOME}/warning/unused-import.html"
-                    },
-                    "source": LINTER["name"],
-                },
-            ],
+            "diagnostics": _expected_sample_diagnostics(),
         }
     else:
         expected = {
@@ -5,12 +5,14 @@ Test for path and interpreter settings.
 from threading import Event
 from typing import Dict
 
+import pytest
 from hamcrest import assert_that, is_
 
 from .lsp_test_client import constants, defaults, session, utils
 
 TEST_FILE_PATH = constants.TEST_DATA / "sample1" / "sample.py"
 TEST_FILE_URI = utils.as_uri(str(TEST_FILE_PATH))
+TEST_FILE_CONTENTS = TEST_FILE_PATH.read_text(encoding="utf-8")
 TIMEOUT = 10  # 10 seconds
 
 
@@ -26,22 +28,23 @@ class CallbackObject:
 
     def check_for_argv_duplication(self, argv: Dict[str, str]):
         """checks if argv duplication exists and sets result boolean"""
-        if argv["type"] == 4 and argv["message"].find("--from-stdin") >= 0:
-            parts = argv["message"].split()
-            count = len([x for x in parts if x.startswith("--from-stdin")])
-            self.result = count > 1
+        if self.result or argv["type"] != 4:
+            # Duplication already seen, or not a log message.
+            return
+        self.result = argv["message"].count("--from-stdin") > 1
 
 
-def test_path():
-    """Test linting using pylint bin path set."""
-
+@pytest.mark.parametrize(
+    ("setting", "value"), [("path", ["pylint"]), ("interpreter", ["python"])]
+)
+def test_path_specialization(setting, value):
+    """Test linting using pylint bin path or specific python path set."""
     default_init = defaults.vscode_initialize_defaults()
-    default_init["initializationOptions"]["settings"][0]["path"] = ["pylint"]
+    default_init["initializationOptions"]["settings"][0][setting] = value
 
     argv_callback_object = CallbackObject()
-    contents = TEST_FILE_PATH.read_text(encoding="utf-8")
+    contents = TEST_FILE_CONTENTS
 
-    actual = True
     with session.LspSession() as ls_session:
         ls_session.set_notification_callback(
             session.WINDOW_LOG_MESSAGE,
@@ -71,79 +74,28 @@ def test_path():
         done.wait(TIMEOUT)
         done.clear()
 
-        # Call this second time to detect arg duplication.
-        ls_session.notify_did_open(
+        # Lint a second time to detect arg duplication. The document is edited
+        # so that pylint runs again rather than the previous result being used.
+        ls_session.notify_did_change(
             {
                 "textDocument": {
                     "uri": TEST_FILE_URI,
-                    "languageId": "python",
-                    "version": 1,
-                    "text": contents,
-                }
+                    "version": 2,
+                },
+                "contentChanges": [
+                    {
+                        "range": {
+                            "start": {"line": 3, "character": 0},
+                            "end": {"line": 3, "character": 0},
+                        },
+                        "text": "print(y)\n",
+                    }
+                ],
             }
         )
+        ls_session.notify_did_save({"textDocument": {"uri": TEST_FILE_URI}})
 
         # wait for some time to receive all notifications
         done.wait(TIMEOUT)
 
-        actual = argv_callback_object.check_result()
-
-    assert_that(actual, is_(False))
-
-
-def test_interpreter():
-    """Test linting using specific python path."""
-    default_init = defaults.vscode_initialize_defaults()
-    default_init["initializationOptions"]["settings"][0]["interpreter"] = ["python"]
-
-    argv_callback_object = CallbackObject()
-    contents = TEST_FILE_PATH.read_text(encoding="utf-8")
-
-    actual = True
-    with session.LspSession() as ls_session:
-        ls_session.set_notification_callback(
-            session.WINDOW_LOG_MESSAGE,
-            argv_callback_object.check_for_argv_duplication,
-        )
-
-        done = Event()
-
-        def _handler(_params):
-            done.set()
-
-        ls_session.set_notification_callback(session.PUBLISH_DIAGNOSTICS, _handler)
-
-        ls_session.initialize(default_init)
-        ls_session.notify_did_open(
-            {
-                "textDocument": {
-                    "uri": TEST_FILE_URI,
-                    "languageId": "python",
-                    "version": 1,
-                    "text": contents,
-                }
-            }
-        )
-
-        # wait for some time to receive all notifications
-        done.wait(TIMEOUT)
-        done.clear()
-
-        # Call this second time to detect arg duplication.
-        ls_session.notify_did_open(
-            {
-                "textDocument": {
-                    "uri": TEST_FILE_URI,
-                    "languageId": "python",
-                    "version": 1,
-                    "text": contents,
-                }
-            }
-        )
-
-        # wait for some time to receive all notifications
-        done.wait(TIMEOUT)
-
-        actual = argv_callback_object.check_result()
-
-    assert_that(actual, is_(False))
+    assert_that(argv_callback_object.check_result(), is_(False))
@@ -0,0 +1,87 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Test for superseding executable runs.
+"""
+
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, current_thread
+
+from hamcrest import assert_that, calling, is_, raises
+
+from .lsp_test_client import constants
+
+sys.path.insert(0, os.fspath(constants.PROJECT_ROOT / "bundled" / "tool"))
+import lsp_utils  # pylint: disable=wrong-import-position
+
+TIMEOUT = 10  # 10 seconds
+KEY = "file:///sample.py"
+
+
+def _run(script: str, source: str) -> lsp_utils.RunResult:
+    return lsp_utils.run_path(
+        argv=[sys.executable, "-c", script],
+        use_stdin=True,
+        cwd=os.getcwd(),
+        source=source,
+        key=KEY,
+    )
+
+
+def test_run_path_supersedes_running(monkeypatch):
+    """Test to ensure a run terminates the run with the same key in progress."""
+    older_started = Event()
+    popen = subprocess.Popen
+
+    def _popen(*args, **kwargs):
+        process = popen(*args, **kwargs)
+        if current_thread().name.startswith("older"):
+            older_started.set()
+        return process
+
+    monkeypatch.setattr(lsp_utils.subprocess, "Popen", _popen)
+
+    older_script = f"import sys, time\nsys.stdin.read()\ntime.sleep({TIMEOUT})\n"
+    newer_script = "import sys\nprint(sys.stdin.read())\n"
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="older") as executor:
+        older = executor.submit(_run, older_script, "older")
+        older_started.wait(TIMEOUT)
+        newer = _run(newer_script, "newer")
+
+        assert_that(
+            calling(older.result).with_args(TIMEOUT),
+            raises(lsp_utils.RunCancelledError),
+        )
+    assert_that(newer.stdout.strip(), is_("newer"))
+
+
+def test_run_path_older_run_starting_late(monkeypatch):
+    """Test to ensure a run that starts before another one with the same key, but
+    registers its process after it, cancels itself."""
+    older_starting = Event()
+    release_older = Event()
+    popen = subprocess.Popen
+
+    def _popen(*args, **kwargs):
+        if current_thread().name.startswith("older"):
+            older_starting.set()
+            release_older.wait(TIMEOUT)
+        return popen(*args, **kwargs)
+
+    monkeypatch.setattr(lsp_utils.subprocess, "Popen", _popen)
+
+    script = "import sys\nprint(sys.stdin.read())\n"
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="older") as executor:
+        older = executor.submit(_run, script, "older")
+        older_starting.wait(TIMEOUT)
+        newer = _run(script, "newer")
+        release_older.set()
+
+        assert_that(
+            calling(older.result).with_args(TIMEOUT),
+            raises(lsp_utils.RunCancelledError),
+        )
+    assert_that(newer.stdout.strip(), is_("newer"))
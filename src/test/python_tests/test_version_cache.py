@@ -0,0 +1,97 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Test for caching the pylint version across sessions.
+"""
+
+import importlib.util
+import json
+import os
+import pathlib
+from typing import List
+
+import pytest
+from hamcrest import assert_that, has_item, is_, starts_with
+
+from .lsp_test_client import defaults, session
+
+# Linting in the server process, and in a runner under another interpreter.
+INTERPRETERS = [[], ["python"]]
+
+
+def _get_version_logs(interpreter: List[str]) -> List[str]:
+    """Starts a server with the default settings and the given interpreter, and
+    returns the version info it logged."""
+    messages = []
+
+    def _handler(params):
+        if params["message"].startswith("Version info for linter"):
+            messages.append(params["message"].splitlines()[1])
+
+    default_init = defaults.vscode_initialize_defaults()
+    default_init["initializationOptions"]["settings"][0]["interpreter"] = interpreter
+
+    with session.LspSession() as ls_session:
+        ls_session.set_notification_callback(session.WINDOW_LOG_MESSAGE, _handler)
+        ls_session.initialize(default_init)
+    return messages
+
+
+def _get_cache_file() -> pathlib.Path:
+    return (
+        pathlib.Path(os.environ["XDG_CACHE_HOME"]) / "vscode-pylint" / "versions.json"
+    )
+
+
+@pytest.mark.parametrize("interpreter", INTERPRETERS)
+def test_version_cache_hit(monkeypatch, tmp_path, interpreter: List[str]):
+    """Test to ensure the version cached by an earlier session is re-used while
+    pylint is unchanged."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    _get_version_logs(interpreter)
+
+    cache = json.loads(_get_cache_file().read_text(encoding="utf-8"))
+    for entry in cache.values():
+        entry["stdout"] = "pylint 99.0.0\nastroid 99.0.0\n"
+    _get_cache_file().write_text(json.dumps(cache), encoding="utf-8")
+
+    assert_that(_get_version_logs(interpreter), has_item("pylint 99.0.0"))
+
+
+@pytest.mark.parametrize("interpreter", INTERPRETERS)
+def test_version_cache_stamp_mismatch(monkeypatch, tmp_path, interpreter: List[str]):
+    """Test to ensure pylint is run for its version when the file it is run from
+    changed since the version was cached."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    _get_version_logs(interpreter)
+
+    cache = json.loads(_get_cache_file().read_text(encoding="utf-8"))
+    stamps = {}
+    for key, entry in cache.items():
+        stamps[key] = list(entry["stamp"])
+        entry["stamp"][1] -= 1
+        entry["stdout"] = "pylint 99.0.0\nastroid 99.0.0\n"
+    _get_cache_file().write_text(json.dumps(cache), encoding="utf-8")
+
+    versions = _get_version_logs(interpreter)
+    assert_that(versions[0], starts_with("pylint "))
+    assert_that("pylint 99.0.0" in versions, is_(False))
+
+    # The cache is updated with the new stamp.
+    cache = json.loads(_get_cache_file().read_text(encoding="utf-8"))
+    assert_that({key: entry["stamp"] for key, entry in cache.items()}, is_(stamps))
+
+
+def test_version_cache_stamps_imported_pylint(monkeypatch, tmp_path):
+    """Test to ensure the stamp under another interpreter is the version file of
+    the pylint package that interpreter imports."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    _get_version_logs(["python"])
+
+    spec = importlib.util.find_spec("pylint")
+    expected = os.path.join(os.path.dirname(spec.origin), "__pkginfo__.py")
+    cache = json.loads(_get_cache_file().read_text(encoding="utf-8"))
+    assert_that(
+        [entry["stamp"][0] for entry in cache.values()],
+        is_([os.path.normcase(expected)]),
+    )
@@ -0,0 +1,87 @@
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License.
+"""
+Test for adding and removing workspace folders.
+"""
+
+import copy
+from typing import List
+
+from hamcrest import assert_that, has_item, is_, not_
+
+from .lsp_test_client import constants, defaults, session, utils
+
+TEST_FILE_PATH = constants.TEST_DATA / "sample1" / "sample.py"
+TEST_FILE_URI = utils.as_uri(str(TEST_FILE_PATH))
+TEST_FILE_CONTENTS = TEST_FILE_PATH.read_text(encoding="utf-8")
+INNER_WORKSPACE_URI = utils.as_uri(str(TEST_FILE_PATH.parent))
+OUTER_WORKSPACE_URI = utils.as_uri(str(constants.PROJECT_ROOT))
+TIMEOUT = 10  # 10 seconds
+
+
+def test_removed_workspace_folders():
+    """Test to ensure documents of removed workspace folders are linted with the
+    settings of the enclosing folder, and with the global settings once no
+    folder is left."""
+    default_init = defaults.vscode_initialize_defaults()
+    init_options = default_init["initializationOptions"]
+    outer = copy.deepcopy(init_options["settings"][0])
+    outer["args"] = ["--disable=C0114"]
+    inner = copy.deepcopy(outer)
+    inner["workspace"] = INNER_WORKSPACE_URI
+    inner["args"] = ["--disable=W0611"]
+    init_options["settings"] = [outer, inner]
+    default_init["workspaceFolders"].append(
+        {"uri": INNER_WORKSPACE_URI, "name": "sample1"}
+    )
+
+    argv_logs = []
+
+    def _log_handler(params):
+        if "--from-stdin" in params["message"]:
+            argv_logs.append(params["message"])
+
+    def _lint() -> List[str]:
+        ls_session.notify_did_save({"textDocument": {"uri": TEST_FILE_URI}})
+        actual = ls_session.next_diagnostics(TEST_FILE_URI, TIMEOUT)
+        return [d["code"].split(":")[0] for d in actual["diagnostics"]]
+
+    def _remove_folder(uri: str, name: str) -> None:
+        ls_session.notify_did_change_workspace_folders(
+            {"event": {"added": [], "removed": [{"uri": uri, "name": name}]}}
+        )
+
+    with session.LspSession() as ls_session:
+        ls_session.set_notification_callback(session.WINDOW_LOG_MESSAGE, _log_handler)
+        ls_session.initialize(default_init)
+
+        ls_session.notify_did_open(
+            {
+                "textDocument": {
+                    "uri": TEST_FILE_URI,
+                    "languageId": "python",
+                    "version": 1,
+                    "text": TEST_FILE_CONTENTS,
+                }
+            }
+        )
+        actual = ls_session.next_diagnostics(TEST_FILE_URI, TIMEOUT)
+        codes = [d["code"].split(":")[0] for d in actual["diagnostics"]]
+        assert_that(codes, not_(has_item("W0611")))
+        assert_that(codes, has_item("C0114"))
+
+        # Linted with the settings of the enclosing folder.
+        _remove_folder(INNER_WORKSPACE_URI, "sample1")
+        codes = _lint()
+        assert_that(codes, has_item("W0611"))
+        assert_that(codes, not_(has_item("C0114")))
+        # The version of pylint for the enclosing folder is still known.
+        assert_that("--clear-cache-post-run=y" in argv_logs[-1], is_(True))
+
+        # Linted with the global settings, the pylint versions of the removed
+        # folders are forgotten.
+        _remove_folder(OUTER_WORKSPACE_URI, "my_project")
+        codes = _lint()
+        assert_that(codes, has_item("W0611"))
+        assert_that(codes, has_item("C0114"))
+        assert_that("--clear-cache-post-run=y" in argv_logs[-1], is_(False))
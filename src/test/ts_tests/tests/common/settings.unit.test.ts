@@ -8,7 +8,12 @@ import * as TypeMoq from 'typemoq';
 import { Uri, WorkspaceConfiguration, WorkspaceFolder } from 'vscode';
 import { EXTENSION_ROOT_DIR } from '../../../../common/constants';
 import * as python from '../../../../common/python';
-import { ISettings, getWorkspaceSettings, isLintOnChangeEnabled } from '../../../../common/settings';
+import {
+    ISettings,
+    getWorkspaceSettings,
+    isLintOnChangeEnabled,
+    isPullDiagnosticsEnabled,
+} from '../../../../common/settings';
 import * as vscodeapi from '../../../../common/vscodeapi';
 
 // eslint-disable-next-line @typescript-eslint/naming-convention
@@ -307,5 +312,15 @@ suite('Settings Tests', () => {
                 assert.deepStrictEqual(isLintOnChangeEnabled('pylint'), value);
             });
         });
+
+        [true, false].forEach((value) => {
+            test(`Pull diagnostics settings: ${value}`, async () => {
+                configMock
+                    .setup((c) => c.get<boolean>('pullDiagnostics', false))
+                    .returns(() => value)
+                    .verifiable(TypeMoq.Times.atLeastOnce());
+                assert.deepStrictEqual(isPullDiagnosticsEnabled('pylint'), value);
+            });
+        });
     });
 });